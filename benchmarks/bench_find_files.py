@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Micro-benchmark of find_files() against the original os.walk + fnmatch implementation.
+
+python benchmarks/bench_find_files.py --dirs 2000 --files 20
+"""
+
+import argparse
+import fnmatch
+import os
+import tempfile
+import time
+
+from md2quip.md2quip import md2quip
+
+INCLUDE = ['*.md', '*.markdown', 'docs/**/*.txt', '!CHANGELOG.md']
+EXCLUDE = ['.*', '/templates', 'node_modules/', 'build/', '*.tmp', '**/vendor', 'site/', 'dist/', '__pycache__/']
+
+
+def legacy_filter_paths(basename, path, is_dir, exclude):
+    """The original per-call fnmatch loop"""
+    for item in exclude:
+        if item.endswith('/') and not is_dir:
+            continue
+        match = path if item.startswith('/') else basename
+        if fnmatch.fnmatch(match, item.strip('/')):
+            return True
+    return False
+
+
+def legacy_find_files(project_root, include, exclude):
+    files = []
+    for source_dir, dirnames, filenames in os.walk(project_root, followlinks=True):
+        relative_dir = os.path.relpath(source_dir, project_root)
+        for dirname in list(dirnames):
+            path = os.path.normpath(os.path.join(relative_dir, dirname))
+            if legacy_filter_paths(basename=dirname, path=path, is_dir=True, exclude=exclude):
+                dirnames.remove(dirname)
+        dirnames.sort()
+        for filename in filenames:
+            path = os.path.normpath(os.path.join(relative_dir, filename))
+            if legacy_filter_paths(basename=filename, path=path, is_dir=False, exclude=include):
+                files.append(path)
+    return files
+
+
+def build_tree(root, dirs, files_per_dir):
+    """dirs directories, 4 levels deep, with a mix of wanted & unwanted files & directories"""
+    for d in range(dirs):
+        path = os.path.join(root, f"d{d % 10}", f"e{d % 7}", f"f{d}")
+        if d % 50 == 0:
+            path = os.path.join(path, "node_modules")
+        os.makedirs(path, exist_ok=True)
+        for f in range(files_per_dir):
+            ext = ('md', 'txt', 'py', 'tmp', 'markdown')[f % 5]
+            open(os.path.join(path, f"file{f}.{ext}"), 'w').close()
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=1000)
+    parser.add_argument('--files', type=int, default=20, help='files per directory')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_tree(root, args.dirs, args.files)
+        m = md2quip(
+            'https://quip.example.com/root', project_root=root, quip_client=object(), include=INCLUDE, exclude=EXCLUDE
+        )
+
+        legacy, legacy_files = timed(lambda: legacy_find_files(root, INCLUDE, EXCLUDE), args.repeat)
+        compiled, files = timed(m.find_files, args.repeat)
+
+    print(f"tree: {args.dirs} dirs x {args.files} files")
+    print(f"os.walk + fnmatch:       {legacy * 1000:8.1f}ms ({len(legacy_files)} files)")
+    print(f"os.scandir + PathMatcher: {compiled * 1000:8.1f}ms ({len(files)} files)")
+    print(f"speedup: {legacy / compiled:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
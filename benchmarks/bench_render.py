@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""Throughput of the local renderer on a synthetic Markdown corpus, cold & with a warm render cache.
+
+poetry run python benchmarks/bench_render.py --docs 2000 --paragraphs 40
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from synthetic import make_document
+
+from md2quip.render import Renderer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--paragraphs', type=int, default=40)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    corpus = [make_document(n, args.paragraphs, rng) for n in range(args.docs)]
+    size_mb = sum(len(doc) for doc in corpus) / 1e6
+
+    def run(label, renderer):
+        start = time.perf_counter()
+        for doc in corpus:
+            renderer.render(doc)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:12} {args.docs / elapsed:10.0f} docs/s {size_mb / elapsed:8.2f} MB/s "
+            f"(hits={renderer.cache.hits}, misses={renderer.cache.misses})"
+        )
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        renderer = Renderer(cache_dir=cache_dir)
+        run('cold', renderer)
+        run('warm memory', renderer)
+        run('warm disk', Renderer(cache_dir=cache_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""End to end benchmarks of crawl, find_files & publish against the simulated Quip API.
+
+poetry run python benchmarks/bench_suite.py --depth 3 --fanout 4 --threads 5 --docs 500 --latency 0.02
+
+Every scenario runs on a fresh md2quip, like a new CLI invocation, and reports wall time, peak
+Python memory (tracemalloc, which also slows things down a little) & the API calls the simulator saw.
+The simulator runs in its own process so that it doesn't compete with md2quip for the GIL.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+from synthetic import build_markdown_repo, touch_documents
+
+from md2quip.md2quip import DEFAULT_CONCURRENCY, md2quip
+
+QUIPSIM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quipsim.py')
+
+
+class Simulator(object):
+    """quipsim.py running in a subprocess"""
+
+    def __init__(self, args):
+        command = [
+            sys.executable,
+            QUIPSIM,
+            f"--depth={args.depth}",
+            f"--fanout={args.fanout}",
+            f"--threads={args.threads}",
+            f"--doc-size={args.doc_size}",
+            f"--latency={args.latency}",
+        ]
+        if args.rate_limit:
+            command.append(f"--requests-per-minute={args.rate_limit}")
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True)
+        self.root_url = self.process.stdout.readline().strip()
+        self.base_url = self.root_url.rsplit('/', 1)[0]
+
+    def _call(self, path, method='GET'):
+        request = urllib.request.Request(self.base_url + path, method=method)
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode())
+
+    def reset(self):
+        self._call('/_sim/reset', method='POST')
+
+    def stats(self):
+        return self._call('/_sim/stats')
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def measure(name, sim, fn, trace_memory=True):
+    sim.reset()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    detail = fn()
+    wall = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    calls = sim.stats()
+    result = {
+        'name': name,
+        'wall': wall,
+        'peak_memory': peak,
+        'api_calls': sum(n for endpoint, n in calls.items() if endpoint != 'throttled'),
+        'calls': calls,
+        'detail': detail,
+    }
+    print(
+        f"{name:22} {wall:8.2f}s {peak / 1e6:8.1f}MB {result['api_calls']:6} calls"
+        f" {calls.get('throttled', 0):4} throttled  {detail or ''}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--depth', type=int, default=3, help='levels of Quip folders below the root')
+    parser.add_argument('--fanout', type=int, default=4, help='sub-folders in each Quip folder')
+    parser.add_argument('--threads', type=int, default=5, help='documents in each Quip folder')
+    parser.add_argument('--doc-size', type=int, default=2000, help='bytes of HTML in each Quip document')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every API response')
+    parser.add_argument('--rate-limit', type=int, default=None, help="simulated Quip's requests per minute")
+    parser.add_argument('--docs', type=int, default=200, help='Markdown files in the local repo')
+    parser.add_argument('--paragraphs', type=int, default=20, help='paragraphs in each Markdown file')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--no-memory', action='store_true', help="don't trace memory, for more accurate timings")
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    # md2quip only throttles itself when the simulator is rate limited
+    requests_per_minute = args.rate_limit or 1000000
+    trace_memory = not args.no_memory
+    results = []
+
+    sim = Simulator(args)
+    try:
+        with tempfile.TemporaryDirectory() as repo, tempfile.TemporaryDirectory() as cache_dir:
+            paths = build_markdown_repo(repo, docs=args.docs, paragraphs=args.paragraphs)
+
+            def new_md2quip(**kwargs):
+                return md2quip(
+                    sim.root_url,
+                    project_root=repo,
+                    quip_api_base_url=sim.base_url,
+                    quip_api_access_token='benchmark',
+                    concurrency=args.concurrency,
+                    requests_per_minute=requests_per_minute,
+                    **kwargs,
+                )
+
+            def crawl(**kwargs):
+                m = new_md2quip(**kwargs)
+                m.show_folders_and_docs()
+                return f"folders={m.stats.counters['folders']} threads={m.stats.counters['threads']}"
+
+            def find_files():
+                return f"files={len(new_md2quip().find_files())}"
+
+            def publish():
+                m = new_md2quip()
+                m.publish(m.iter_files())
+                counters = m.stats.counters
+                return f"api_calls={counters['api_calls']} retries={counters['api_retries']}"
+
+            print(f"Quip tree: depth={args.depth} fanout={args.fanout} threads={args.threads} latency={args.latency}s")
+            print(f"local repo: {args.docs} documents")
+            results.append(measure('crawl', sim, crawl, trace_memory))
+            crawl(cache_dir=cache_dir)
+            results.append(measure('crawl (warm cache)', sim, lambda: crawl(cache_dir=cache_dir), trace_memory))
+            results.append(measure('find_files', sim, find_files, trace_memory))
+            results.append(measure('publish (new)', sim, publish, trace_memory))
+            results.append(measure('publish (unchanged)', sim, publish, trace_memory))
+            touch_documents(repo, paths)
+            results.append(measure('publish (10% changed)', sim, publish, trace_memory))
+    finally:
+        sim.close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+"""A local stand-in for the Quip API, serving a synthetic folder tree with injected latency & rate limits.
+
+poetry run python benchmarks/quipsim.py --depth 3 --fanout 4 --threads 5 --latency 0.05
+
+Only the endpoints md2quip uses are implemented. GET /_sim/stats returns the number of calls made to
+each endpoint, POST /_sim/reset zeroes them.
+"""
+
+import argparse
+import collections
+import gzip
+import http.server
+import json
+import math
+import random
+import re
+import socketserver
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import quipclient
+
+from md2quip.diff import split_blocks
+
+# the id in the URL of the root folder, like the secret path of a real Quip folder
+ROOT_SECRET = 'SIMROOT0001'
+
+WORDS = "quip markdown render cache folder thread publish section document link table code".split()
+
+_FIRST_TAG_RE = re.compile(r'^<([a-zA-Z0-9]+)')
+
+
+class QuipTree(object):
+    """Folders & threads in the shape returned by the Quip API"""
+
+    def __init__(self):
+        self.folders = {}
+        self.threads = {}
+        # key=thread_id, value=list of [section_id, html]
+        self.sections = {}
+        self.aliases = {}
+        self._ids = collections.Counter()
+        self._lock = threading.Lock()
+
+    def new_id(self, prefix):
+        with self._lock:
+            self._ids[prefix] += 1
+            return f"{prefix}{self._ids[prefix]:0{11 - len(prefix)}d}"
+
+    def _now(self):
+        return int(time.time() * 1e6)
+
+    def add_folder(self, title, parent_id=None):
+        folder_id = self.new_id('F')
+        now = self._now()
+        self.folders[folder_id] = {
+            'children': [],
+            'folder': {
+                'id': folder_id,
+                'title': title,
+                'parent_id': parent_id,
+                'created_usec': now,
+                'updated_usec': now,
+                'link': f"https://quip.example.com/{folder_id}",
+                'folder_type': 'shared',
+            },
+            'member_ids': [],
+        }
+        if parent_id is not None:
+            self.folders[parent_id]['children'].append({'folder_id': folder_id})
+            self.folders[parent_id]['folder']['updated_usec'] = now
+        return folder_id
+
+    def add_thread(self, folder_id, title, html):
+        thread_id = self.new_id('T')
+        now = self._now()
+        self.sections[thread_id] = self._sections(html)
+        self.threads[thread_id] = {
+            'html': None,
+            'thread': {
+                'id': thread_id,
+                'title': title,
+                'type': 'document',
+                'created_usec': now,
+                'updated_usec': now,
+                'link': f"https://quip.example.com/{thread_id}",
+            },
+            'shared_folder_ids': [folder_id],
+        }
+        self.folders[folder_id]['children'].append({'thread_id': thread_id})
+        self.folders[folder_id]['folder']['updated_usec'] = now
+        return thread_id
+
+    def _sections(self, html):
+        """Give every top level block of html a section id, the way Quip does"""
+        sections = []
+        for block in split_blocks(html):
+            section_id = self.new_id('S')
+            sections.append([section_id, _FIRST_TAG_RE.sub(rf"<\1 id='{section_id}'", block.html, count=1)])
+        return sections
+
+    def get_folder(self, folder_id):
+        return self.folders.get(self.aliases.get(folder_id, folder_id))
+
+    def get_thread(self, thread_id):
+        thread = self.threads.get(thread_id)
+        if thread is None:
+            return None
+        return dict(thread, html=''.join(f"{html}\n\n" for _, html in self.sections[thread_id]))
+
+    def edit(self, thread_id, operation, content, section_id=None):
+        sections = self.sections[thread_id]
+        new = self._sections(content)
+        index = next((i for i, (sid, _) in enumerate(sections) if sid == section_id), None)
+        if operation in (quipclient.QuipClient.APPEND, quipclient.QuipClient.PREPEND):
+            index = len(sections) if operation == quipclient.QuipClient.APPEND else 0
+            sections[index:index] = new
+        elif index is None:
+            raise KeyError(section_id)
+        elif operation == quipclient.QuipClient.AFTER_SECTION:
+            sections[index + 1 : index + 1] = new
+        elif operation == quipclient.QuipClient.BEFORE_SECTION:
+            sections[index:index] = new
+        elif operation == quipclient.QuipClient.REPLACE_SECTION:
+            sections[index : index + 1] = new
+        elif operation == quipclient.QuipClient.DELETE_SECTION:
+            del sections[index]
+        self.threads[thread_id]['thread']['updated_usec'] = self._now()
+
+
+def make_html(size, rng):
+    """About size bytes of Quip style HTML"""
+    blocks = []
+    while sum(len(b) for b in blocks) < size:
+        blocks.append(f"<p>{' '.join(rng.choices(WORDS, k=12))}</p>")
+    return '\n\n'.join(blocks)
+
+
+def build_tree(depth=3, fanout=4, threads=5, doc_size=2000, seed=42):
+    """A tree of depth levels of folders below the root, each with fanout sub-folders & threads documents"""
+    rng = random.Random(seed)
+    tree = QuipTree()
+    root = tree.add_folder('Root')
+    tree.aliases[ROOT_SECRET] = root
+
+    level = [root]
+    for d in range(depth + 1):
+        next_level = []
+        for folder_id in level:
+            for t in range(threads):
+                tree.add_thread(folder_id, f"Document {t}", make_html(doc_size, rng))
+            if d < depth:
+                for f in range(fanout):
+                    next_level.append(tree.add_folder(f"folder-{d}-{f}", parent_id=folder_id))
+        level = next_level
+    return tree
+
+
+class RateLimit(object):
+    """Token bucket that answers like Quip's per minute rate limit"""
+
+    def __init__(self, requests_per_minute):
+        self.limit = requests_per_minute
+        self.rate = requests_per_minute / 60.0
+        self.tokens = float(requests_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Returns (allowed, headers)"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            allowed = self.tokens >= 1
+            if allowed:
+                self.tokens -= 1
+            wait = max(0.0, 1 - self.tokens) / self.rate
+        headers = {
+            'X-Ratelimit-Limit': str(self.limit),
+            'X-Ratelimit-Remaining': str(int(self.tokens)),
+            'X-Ratelimit-Reset': str(int(math.ceil(time.time() + wait))),
+        }
+        if not allowed:
+            headers['Retry-After'] = f"{wait:.3f}"
+        return allowed, headers
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body).encode() if not isinstance(body, bytes) else body
+        headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        sim = self.server.simulator
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if method == 'POST':
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            # blobs are multipart & only their size matters here
+            if not url.path.startswith('/1/blob/'):
+                params.update({k: v[0] for k, v in parse_qs(body.decode()).items()})
+
+        if url.path.startswith('/_sim/'):
+            if url.path == '/_sim/reset':
+                sim.reset()
+            return self._reply(200, sim.stats())
+
+        if sim.latency:
+            time.sleep(sim.latency)
+
+        headers = {}
+        if sim.rate_limit is not None:
+            allowed, headers = sim.rate_limit.take()
+            if not allowed:
+                sim.count('throttled')
+                return self._reply(429, {'error': 'Over Rate Limit', 'error_description': 'Over Rate Limit'}, headers)
+
+        # the tree isn't thread safe, and responses are encoded before anyone else can change it
+        with sim.tree_lock:
+            endpoint, status, body = sim.route(method, url.path, params)
+            data = json.dumps(body).encode()
+        sim.count(endpoint)
+        self._reply(status, data, headers)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """http.server.ThreadingHTTPServer, which needs Python 3.7"""
+
+    daemon_threads = True
+
+
+class QuipSimulator(object):
+    """Serve a QuipTree over HTTP on 127.0.0.1, use as a context manager or call start() & stop()"""
+
+    def __init__(self, tree, latency=0.0, requests_per_minute=None, port=0):
+        self.tree = tree
+        self.latency = latency
+        self.rate_limit = RateLimit(requests_per_minute) if requests_per_minute else None
+        self.calls = collections.Counter()
+        self.tree_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        self.server = _Server(('127.0.0.1', port), _Handler)
+        self.server.simulator = self
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.root_url = f"{self.base_url}/{ROOT_SECRET}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def stats(self):
+        """Calls to each endpoint, requests turned away by the rate limit are counted as 'throttled'"""
+        with self._lock:
+            return dict(self.calls)
+
+    def route(self, method, path, params):
+        """Returns (endpoint, status, body)"""
+        tree = self.tree
+        not_found = {'error': 'Not Found', 'error_description': 'Not Found'}
+        ids = [i for i in params.get('ids', '').split(',') if i]
+
+        if path == '/1/folders/' and method == 'POST':
+            return 'get_folders', 200, {i: tree.get_folder(i) for i in ids if tree.get_folder(i)}
+        if path == '/1/threads/' and method == 'POST':
+            return 'get_threads', 200, {i: tree.get_thread(i) for i in ids if tree.get_thread(i)}
+        if path == '/1/folders/new' and method == 'POST':
+            parent_id = tree.aliases.get(params.get('parent_id'), params.get('parent_id'))
+            if parent_id not in tree.folders:
+                return 'new_folder', 404, not_found
+            return 'new_folder', 200, tree.get_folder(tree.add_folder(params.get('title', ''), parent_id))
+        if path == '/1/threads/new-document':
+            folder_id = (params.get('member_ids') or tree.aliases[ROOT_SECRET]).split(',')[0]
+            thread_id = tree.add_thread(folder_id, params.get('title') or 'Untitled', params.get('content', ''))
+            return 'new_document', 200, tree.get_thread(thread_id)
+        if path == '/1/threads/edit-document':
+            try:
+                tree.edit(
+                    params['thread_id'],
+                    int(params.get('location', quipclient.QuipClient.APPEND)),
+                    params.get('content', ''),
+                    params.get('section_id'),
+                )
+            except KeyError:
+                return 'edit_document', 400, {'error': 'Bad Request', 'error_description': 'Invalid section_id'}
+            return 'edit_document', 200, tree.get_thread(params['thread_id'])
+        if path.startswith('/1/blob/') and method == 'POST':
+            thread_id = path[len('/1/blob/') :]
+            if thread_id not in tree.threads:
+                return 'put_blob', 404, not_found
+            blob_id = tree.new_id('B')
+            return 'put_blob', 200, {'id': blob_id, 'url': f"/blob/{thread_id}/{blob_id}"}
+        if path == '/1/users/current':
+            return 'get_authenticated_user', 200, {'id': 'SIMUSER0001', 'name': 'Simulated User'}
+        if path.startswith('/1/folders/'):
+            folder = tree.get_folder(path[len('/1/folders/') :])
+            return 'get_folder', 200 if folder else 404, folder or not_found
+        if path.startswith('/1/threads/'):
+            thread = tree.get_thread(path[len('/1/threads/') :])
+            return 'get_thread', 200 if thread else 404, thread or not_found
+        return 'unknown', 404, not_found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=3, help='levels of folders below the root')
+    parser.add_argument('--fanout', type=int, default=4, help='sub-folders in each folder')
+    parser.add_argument('--threads', type=int, default=5, help='documents in each folder')
+    parser.add_argument('--doc-size', type=int, default=2000, help='bytes of HTML in each document')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--requests-per-minute', type=int, default=None, help='rate limit, unlimited by default')
+    args = parser.parse_args()
+
+    tree = build_tree(args.depth, args.fanout, args.threads, args.doc_size)
+    simulator = QuipSimulator(tree, latency=args.latency, requests_per_minute=args.requests_per_minute, port=args.port)
+    # benchmarks read the URL from the first line of output
+    print(simulator.root_url, flush=True)
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
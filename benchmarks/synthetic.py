@@ -0,0 +1,50 @@
+"""Synthetic Markdown documents & repositories for the benchmarks."""
+
+import os
+import random
+
+WORDS = "quip markdown render cache folder thread publish section document link table code".split()
+
+
+def make_document(n, paragraphs, rng):
+    parts = [f"# Document {n}\n"]
+    for p in range(paragraphs):
+        if p % 10 == 3:
+            parts.append("```python\nfor i in range(10):\n    print(i)\n```\n")
+        elif p % 10 == 6:
+            parts.append("| a | b |\n|---|---|\n" + "".join(f"| {i} | {i * i} |\n" for i in range(5)))
+        elif p % 10 == 8:
+            parts.append("".join(f"- {' '.join(rng.choices(WORDS, k=6))}\n" for _ in range(5)))
+        else:
+            parts.append(' '.join(rng.choices(WORDS, k=60)) + f" see [doc {p}](doc{p}.md).\n")
+    return '\n'.join(parts)
+
+
+def build_markdown_repo(root, docs=200, per_dir=10, paragraphs=20, seed=42):
+    """Write docs Markdown files below root, per_dir to a directory, with some noise find_files should skip.
+    Returns the '/' separated paths of the documents."""
+    rng = random.Random(seed)
+    paths = []
+    for n in range(docs):
+        directory = f"docs/section{n // (per_dir * per_dir)}/topic{n // per_dir}"
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+        path = f"{directory}/doc{n}.md"
+        with open(os.path.join(root, path), 'w') as f:
+            f.write(make_document(n, paragraphs, rng))
+        paths.append(path)
+        if n % per_dir == 0:
+            # things that aren't documentation
+            open(os.path.join(root, directory, 'image.png'), 'w').close()
+            os.makedirs(os.path.join(root, directory, '.hidden'), exist_ok=True)
+            open(os.path.join(root, directory, '.hidden', 'notes.md'), 'w').close()
+    return paths
+
+
+def touch_documents(root, paths, fraction=0.1, seed=7):
+    """Append a paragraph to fraction of paths, returns the ones that changed"""
+    rng = random.Random(seed)
+    changed = rng.sample(paths, max(1, int(len(paths) * fraction)))
+    for path in changed:
+        with open(os.path.join(root, path), 'a') as f:
+            f.write(f"\n{' '.join(rng.choices(WORDS, k=30))}\n")
+    return changed
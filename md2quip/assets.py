@@ -0,0 +1,171 @@
+"""Images & other local files referenced by documents, uploaded to Quip once per workspace."""
+
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import quipclient
+
+logger = logging.getLogger(__name__)
+
+# title of the document that every blob is attached to
+ASSETS_THREAD_TITLE = '.md2quip assets'
+
+_ASSETS_THREAD_CONTENT = "<p>Images &amp; files used by documents published with md2quip.</p>"
+
+
+def hash_file(path):
+    """sha256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AssetStore(object):
+    """Map of content hash -> blob URL for everything uploaded under each Quip root folder.
+
+    Kept in path (a JSON file) between runs, or only in memory when path is None. Each project's
+    manifest keeps a copy of its root's entry too, see adopt() & get_root()."""
+
+    def __init__(self, path=None):
+        self.path = path
+        # key=root folder_id, value={'thread_id': ..., 'blobs': {hash: url}}
+        self.roots = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        if path is not None:
+            try:
+                with open(path, 'r') as f:
+                    self.roots = json.load(f)
+            except FileNotFoundError:
+                pass
+            except ValueError as e:
+                logger.warning(f"Ignoring unreadable {path}: {e}")
+
+    def get(self, root_folder_id, digest):
+        with self._lock:
+            return self.roots.get(root_folder_id, {}).get('blobs', {}).get(digest)
+
+    def put(self, root_folder_id, digest, url):
+        with self._lock:
+            self.roots.setdefault(root_folder_id, {}).setdefault('blobs', {})[digest] = url
+            self._dirty = True
+
+    def get_thread(self, root_folder_id):
+        with self._lock:
+            return self.roots.get(root_folder_id, {}).get('thread_id')
+
+    def set_thread(self, root_folder_id, thread_id):
+        """Remember the thread blobs are attached to, blobs attached to an earlier thread are forgotten"""
+        with self._lock:
+            self.roots[root_folder_id] = {'thread_id': thread_id, 'blobs': {}}
+            self._dirty = True
+
+    def adopt(self, root_folder_id, state):
+        """Take what a manifest remembers about root_folder_id, {'thread_id': ..., 'blobs': {hash: url}}.
+        Ignored if we already know of a different thread for it."""
+        if not state or not state.get('thread_id'):
+            return
+        with self._lock:
+            known = self.roots.get(root_folder_id) or {}
+            if known.get('thread_id') not in (None, state['thread_id']):
+                return
+            blobs = dict(state.get('blobs') or {}, **(known.get('blobs') or {}))
+            if known != {'thread_id': state['thread_id'], 'blobs': blobs}:
+                self.roots[root_folder_id] = {'thread_id': state['thread_id'], 'blobs': blobs}
+                self._dirty = True
+
+    def get_root(self, root_folder_id):
+        """Everything known about root_folder_id, in the form adopt() takes, None if nothing is"""
+        with self._lock:
+            known = self.roots.get(root_folder_id)
+            if not known or not known.get('thread_id'):
+                return None
+            return {'thread_id': known['thread_id'], 'blobs': dict(known.get('blobs') or {})}
+
+    def save(self):
+        """Atomically write the store back to disk, if anything has changed"""
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.roots, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+class AssetUploader(object):
+    """Upload assets to Quip on pool, at most once per content hash.
+
+    upload() returns a Future of the blob URL straight away, so documents can be rendered & queued while
+    the assets they use are still being uploaded."""
+
+    def __init__(self, store, quip_client, pool, stats=None):
+        self.store = store
+        self.quip_client = quip_client
+        self.pool = pool
+        self.stats = stats
+        self._lock = threading.Lock()
+        # key=(root folder_id, hash), value=Future
+        self._in_flight = {}
+        self._thread_locks = {}
+
+    def upload(self, root_folder_id, path, digest):
+        url = self.store.get(root_folder_id, digest)
+        if url is not None:
+            future = concurrent.futures.Future()
+            future.set_result(url)
+            return future
+
+        with self._lock:
+            key = (root_folder_id, digest)
+            if key not in self._in_flight:
+                self._in_flight[key] = self.pool.submit(self._put, root_folder_id, path, digest)
+            return self._in_flight[key]
+
+    def _assets_thread(self, root_folder_id, stale=None):
+        """The thread in root_folder_id that blobs are attached to, created the first time it's needed
+        or when it turns out that the stale thread_id no longer exists"""
+        with self._lock:
+            lock = self._thread_locks.setdefault(root_folder_id, threading.Lock())
+        with lock:
+            thread_id = self.store.get_thread(root_folder_id)
+            if thread_id is None or thread_id == stale:
+                thread = self.quip_client.new_document(
+                    content=_ASSETS_THREAD_CONTENT,
+                    title=ASSETS_THREAD_TITLE,
+                    format='html',
+                    member_ids=[root_folder_id],
+                )
+                thread_id = thread['thread']['id']
+                self.store.set_thread(root_folder_id, thread_id)
+                logger.info(f"Created {ASSETS_THREAD_TITLE} ({thread_id})")
+            return thread_id
+
+    def _put(self, root_folder_id, path, digest):
+        thread_id = self._assets_thread(root_folder_id)
+        try:
+            blob = self._put_blob(thread_id, path)
+        except quipclient.QuipError as e:
+            if e.code not in (403, 404):
+                raise
+            logger.warning(f"{ASSETS_THREAD_TITLE} ({thread_id}) has gone ({e.code}), starting a new one")
+            blob = self._put_blob(self._assets_thread(root_folder_id, stale=thread_id), path)
+        url = blob['url']
+        self.store.put(root_folder_id, digest, url)
+        if self.stats is not None:
+            self.stats.incr('assets_uploaded')
+        logger.info(f"Uploaded {path} as {url}")
+        return url
+
+    def _put_blob(self, thread_id, path):
+        with open(path, 'rb') as f:
+            return self.quip_client.put_blob(thread_id, f, name=os.path.basename(path))
@@ -0,0 +1,137 @@
+"""Persistent on-disk cache of the Quip folder & thread tree."""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from md2quip.defaults import DEFAULT_CACHE_TTL
+from md2quip.records import FolderRecord, ThreadRecord
+
+logger = logging.getLogger(__name__)
+
+# bump when what's stored in body changes, older caches are discarded
+CACHE_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    id TEXT PRIMARY KEY,
+    updated_usec INTEGER,
+    fetched_at REAL NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS threads (
+    id TEXT PRIMARY KEY,
+    updated_usec INTEGER,
+    fetched_at REAL NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    secret_path TEXT PRIMARY KEY,
+    folder_id TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class TreeCache(object):
+    """SQLite backed store of FolderRecords & ThreadRecords.
+
+    Every entry records when it was fetched, entries older than ttl seconds are
+    reported as stale so that the crawl can re-validate them against Quip."""
+
+    def __init__(self, path, ttl=DEFAULT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        # the crawl only touches the cache from one thread at a time, the lock keeps that honest
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+            self._db.executescript("DROP TABLE IF EXISTS folders; DROP TABLE IF EXISTS threads;")
+            self._db.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        self._db.executescript(_SCHEMA)
+        logger.debug(f"Opened tree cache {path} (ttl={ttl})")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def clear(self):
+        """Throw away everything we know about the remote tree"""
+        logger.info(f"Clearing tree cache {self.path}")
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM folders")
+            self._db.execute("DELETE FROM threads")
+            self._db.execute("DELETE FROM aliases")
+
+    def is_fresh(self, fetched_at, now=None):
+        now = time.time() if now is None else now
+        return now - fetched_at <= self.ttl
+
+    def get_folders(self, folder_ids):
+        """Returns a dict of folder_id -> (FolderRecord, fetched_at) for the folder_ids we have cached"""
+        return self._get('folders', folder_ids, FolderRecord)
+
+    def get_threads(self, thread_ids):
+        """Returns a dict of thread_id -> (ThreadRecord, fetched_at) for the thread_ids we have cached"""
+        return self._get('threads', thread_ids, ThreadRecord)
+
+    def put_folders(self, folders):
+        """Store FolderRecords"""
+        self._put('folders', folders)
+
+    def put_threads(self, threads):
+        """Store ThreadRecords"""
+        self._put('threads', threads)
+
+    def get_alias(self, secret_path):
+        """Returns (folder_id, fetched_at) for the secret path in a folder's URL, None if we don't know it"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT folder_id, fetched_at FROM aliases WHERE secret_path = ?", (secret_path,)
+            ).fetchone()
+
+    def put_alias(self, secret_path, folder_id):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO aliases (secret_path, folder_id, fetched_at) VALUES (?, ?, ?)",
+                (secret_path, folder_id, time.time()),
+            )
+
+    def touch_threads(self, thread_ids):
+        """Mark cached threads as freshly validated without re-fetching them"""
+        self._touch('threads', thread_ids)
+
+    def _get(self, table, ids, record_type):
+        found = {}
+        ids = list(ids)
+        with self._lock:
+            # stay well under SQLITE_MAX_VARIABLE_NUMBER
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                rows = self._db.execute(
+                    f"SELECT id, fetched_at, body FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                )
+                for id, fetched_at, body in rows:
+                    found[id] = (record_type.from_list(json.loads(body)), fetched_at)
+        return found
+
+    def _put(self, table, records):
+        now = time.time()
+        rows = [(record.id, record.updated_usec, now, json.dumps(record.to_list())) for record in records]
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO {table} (id, updated_usec, fetched_at, body) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def _touch(self, table, ids):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(f"UPDATE {table} SET fetched_at = ? WHERE id = ?", [(now, id) for id in ids])
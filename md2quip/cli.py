@@ -1,19 +1,34 @@
 """Console script for md2quip."""
 
+import json
 import logging
+import os
 
 import click
 import click_log
-import yaml
 
-from md2quip import md2quip
+# only the defaults are imported up front, everything that talks to Quip is imported by the commands that
+# need it, so that the commands that don't talk to Quip start quickly
+from md2quip.defaults import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CACHE_TTL,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_DEBOUNCE,
+    DEFAULT_EXCLUDE,
+    DEFAULT_INCLUDE,
+    DEFAULT_POLL_INTERVAL,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_REQUESTS_PER_MINUTE,
+)
+from md2quip.files import iter_files
 
 logger = logging.getLogger(__name__)
-click_log.basic_config(logger)
 
-loggers = [logging.getLogger(name) for name in logging.root.manager.loggerDict]
-for logger in loggers:
-    click_log.basic_config(logger)
+# every md2quip module logs below this one, it's the only logger that needs setting up
+package_logger = logging.getLogger('md2quip')
+click_log.basic_config(package_logger)
 
 
 # extend click so that we can load options from a yaml file
@@ -24,11 +39,16 @@ DEFAULT_CFG = 'md2quip.yml'
 def configure(ctx, param, filename):
     try:
         with open(filename, 'r') as f:
+            # only needed when there's a config file to read
+            import yaml
+
             options = yaml.safe_load(f)
             # print(f"options from file = {options}")
-    except KeyError:
+    except FileNotFoundError:
         options = {}
     ctx.default_map = options
+    # remember where the config came from, the cache lives alongside it
+    ctx.meta['md2quip.config'] = filename
 
 
 # set auto_envvar_prefix so that we can load options from environment variables
@@ -49,10 +69,67 @@ CONTEXT_SETTINGS = dict(auto_envvar_prefix='MD2QUIP')
     help='Read option defaults from the specified YAML file',
     show_default=True,
 )
-@click.option('--quip-root', required=True)
+@click.option('--quip-root', help='URL of the Quip folder to publish to, required by everything but sync-all')
 @click.option('--quip-api-base-url', default='https://platform.quip.com')
 @click.option('--quip-api-access-token', required=True)
-@click_log.simple_verbosity_option(logger)
+@click.option(
+    '--concurrency',
+    default=DEFAULT_CONCURRENCY,
+    type=click.IntRange(min=1),
+    help='Maximum number of concurrent Quip API requests',
+    show_default=True,
+)
+@click.option(
+    '--batch-size',
+    default=DEFAULT_BATCH_SIZE,
+    type=click.IntRange(min=1),
+    help='Number of folders or threads fetched by each Quip API request',
+    show_default=True,
+)
+@click.option(
+    '--cache-dir',
+    type=click.Path(file_okay=False),
+    help=f'Directory for the local cache of the Quip tree [default: {DEFAULT_CACHE_DIR} next to the config file]',
+)
+@click.option('--cache/--no-cache', default=True, help='Keep a local cache of the Quip tree between runs')
+@click.option(
+    '--cache-ttl',
+    default=DEFAULT_CACHE_TTL,
+    type=click.IntRange(min=0),
+    help='Seconds before a cached folder or document is checked against Quip again',
+    show_default=True,
+)
+@click.option(
+    '--include',
+    multiple=True,
+    default=DEFAULT_INCLUDE,
+    help='.gitignore style pattern of local files to publish, may be repeated',
+    show_default=True,
+)
+@click.option(
+    '--exclude',
+    multiple=True,
+    default=DEFAULT_EXCLUDE,
+    help='.gitignore style pattern of local files & directories to skip, may be repeated',
+    show_default=True,
+)
+@click.option('--refresh-cache', is_flag=True, default=False, help='Discard the local cache of the Quip tree')
+@click.option(
+    '--pool-size',
+    default=DEFAULT_POOL_SIZE,
+    type=click.IntRange(min=1),
+    help='Number of keep-alive connections to the Quip API',
+    show_default=True,
+)
+@click.option(
+    '--request-timeout',
+    default=DEFAULT_REQUEST_TIMEOUT,
+    type=click.IntRange(min=1),
+    help='Seconds to wait for a Quip API response',
+    show_default=True,
+)
+@click.option('--gzip/--no-gzip', default=True, help='Ask Quip for gzip compressed responses')
+@click_log.simple_verbosity_option(package_logger)
 @click.pass_context
 # def cli(ctx, quip_root, quip_api_base_url, quip_api_access_token):
 def cli(ctx, **kwargs):
@@ -70,42 +147,203 @@ def cli(ctx, **kwargs):
         logger.debug(f"{k}={v}")
         ctx.obj[k] = v
 
-    ctx.obj['md2quip'] = md2quip.md2quip(
+
+def get_md2quip(ctx):
+    """The md2quip of this invocation, built the first time a command asks for it"""
+    if 'md2quip' in ctx.obj:
+        return ctx.obj['md2quip']
+
+    from md2quip.md2quip import md2quip
+
+    cache_dir = None
+    if ctx.obj.get('cache'):
+        cache_dir = ctx.obj.get('cache_dir') or os.path.join(
+            os.path.dirname(ctx.meta['md2quip.config']), DEFAULT_CACHE_DIR
+        )
+
+    ctx.obj['md2quip'] = md2quip(
         quip_root=ctx.obj.get('quip_root'),
         quip_api_base_url=ctx.obj.get('quip_api_base_url'),
         quip_api_access_token=ctx.obj.get('quip_api_access_token'),
+        concurrency=ctx.obj.get('concurrency'),
+        batch_size=ctx.obj.get('batch_size'),
+        cache_dir=cache_dir,
+        cache_ttl=ctx.obj.get('cache_ttl'),
+        refresh_cache=ctx.obj.get('refresh_cache'),
+        include=ctx.obj.get('include'),
+        exclude=ctx.obj.get('exclude'),
+        pool_size=ctx.obj.get('pool_size'),
+        request_timeout=ctx.obj.get('request_timeout'),
+        gzip=ctx.obj.get('gzip'),
     )
+    return ctx.obj['md2quip']
+
+
+def require_quip_root(ctx):
+    if not ctx.obj.get('quip_root'):
+        raise click.UsageError("Missing option '--quip-root'.", ctx=ctx)
+
+
+# options shared by the commands that publish
+def upload_options(f):
+    """--upload-concurrency & --requests-per-minute"""
+    f = click.option(
+        '--requests-per-minute',
+        default=DEFAULT_REQUESTS_PER_MINUTE,
+        type=click.IntRange(min=1),
+        help='Quip API request budget, shared by every upload',
+        show_default=True,
+    )(f)
+    return click.option(
+        '--upload-concurrency',
+        default=DEFAULT_CONCURRENCY,
+        type=click.IntRange(min=1),
+        help='Maximum number of documents uploaded at the same time',
+        show_default=True,
+    )(f)
+
+
+resume_option = click.option(
+    '--resume',
+    is_flag=True,
+    help="Carry on from where an interrupted publish stopped, without creating its documents again",
+)
+
+publish_at_root_option = click.option(
+    '--publish-at-root',
+    is_flag=True,
+    help='Put every new document in the --quip-root folder, rather than in folders that mirror its directory',
+)
 
 
 @cli.command(context_settings=CONTEXT_SETTINGS)
 @click.pass_context
 def find_folders(ctx):
-    ctx.obj['md2quip'].show_folders()
+    require_quip_root(ctx)
+    get_md2quip(ctx).show_folders()
 
 
 @cli.command(context_settings=CONTEXT_SETTINGS)
 @click.pass_context
 def find_folders_and_docs(ctx):
-    ctx.obj['md2quip'].show_folders_and_docs()
+    require_quip_root(ctx)
+    get_md2quip(ctx).show_folders_and_docs()
 
 
 @cli.command(context_settings=CONTEXT_SETTINGS)
 @click.pass_context
 def find_local_files(ctx, path='.'):
-    files = ctx.obj['md2quip'].find_files()
+    files = [local_file.path for local_file in iter_files(path, ctx.obj.get('include'), ctx.obj.get('exclude'))]
     click.echo(f"find_files() = {files}")
 
 
 @cli.command(context_settings=CONTEXT_SETTINGS)
 @click.option('--path', default='.', type=click.Path(exists=True))
-@click.option('--publish-at-root', default=False)
+@publish_at_root_option
+@upload_options
+@resume_option
 @click.pass_context
-def publish(ctx, path, publish_at_root):
-    click.echo(f"Debug mode is {'on' if ctx.obj['debug'] else 'off'}")
+def publish(ctx, path, publish_at_root, upload_concurrency, requests_per_minute, resume):
+    require_quip_root(ctx)
     click.echo(f"path is {path}")
 
-    files = ctx.obj['md2quip'].find_files()
-    ctx.obj['md2quip'].publish(files, root_folder_id=ctx.obj.get('quip_thread_id'))
+    m = get_md2quip(ctx)
+    m.project_root = path
+    m.rate_limiter.set_rate(requests_per_minute)
+    # uploads start while the rest of the project is still being walked
+    files = m.iter_files()
+    m.publish(
+        files,
+        root_folder_id=ctx.obj.get('quip_thread_id'),
+        concurrency=upload_concurrency,
+        resume=resume,
+        at_root=publish_at_root,
+    )
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--path', default='.', type=click.Path(exists=True))
+@publish_at_root_option
+@click.option('--json', 'json_file', type=click.File('w'), help='Also write the plan to this file as JSON')
+@click.pass_context
+def plan(ctx, path, publish_at_root, json_file):
+    """Show what publish would do & roughly what it would cost, without changing anything"""
+    require_quip_root(ctx)
+    m = get_md2quip(ctx)
+    m.project_root = path
+    plan = m.plan(m.iter_files(), at_root=publish_at_root)
+    for line in plan.describe():
+        click.echo(line)
+    if json_file is not None:
+        json.dump(plan.to_dict(), json_file, indent=2)
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@upload_options
+@resume_option
+@click.pass_context
+def sync_all(ctx, upload_concurrency, requests_per_minute, resume):
+    """Publish every project listed under targets: in the config file"""
+    config = ctx.meta['md2quip.config']
+    targets = (ctx.find_root().default_map or {}).get('targets') or []
+    if not targets:
+        raise click.UsageError(f"No targets found in {config}", ctx=ctx)
+
+    for target in targets:
+        # a target without a quip_root of its own goes in the top level one
+        target.setdefault('quip_root', ctx.obj.get('quip_root'))
+        if not target['quip_root']:
+            raise click.UsageError(f"No quip_root for target {target.get('path', '.')} in {config}", ctx=ctx)
+
+    m = get_md2quip(ctx)
+    m.rate_limiter.set_rate(requests_per_minute)
+    # relative paths are relative to the config file, not wherever we happen to be run from
+    config_dir = os.path.dirname(config)
+    m.sync_all(
+        [
+            m.for_target(
+                quip_root=target['quip_root'],
+                project_root=os.path.join(config_dir, target.get('path', '.')),
+                include=target.get('include'),
+                exclude=target.get('exclude'),
+            )
+            for target in targets
+        ],
+        concurrency=upload_concurrency,
+        resume=resume,
+    )
+
+
+@cli.command(context_settings=CONTEXT_SETTINGS)
+@click.option('--path', default='.', type=click.Path(exists=True, file_okay=False))
+@click.option(
+    '--debounce',
+    default=DEFAULT_DEBOUNCE,
+    type=click.FloatRange(min=0),
+    help='Seconds to wait for a burst of saves to finish before publishing',
+    show_default=True,
+)
+@click.option('--polling', is_flag=True, default=False, help='Scan for changes instead of using watchdog')
+@click.option(
+    '--poll-interval',
+    default=DEFAULT_POLL_INTERVAL,
+    type=click.FloatRange(min=0.1),
+    help='Seconds between scans when polling',
+    show_default=True,
+)
+@upload_options
+@click.pass_context
+def watch(ctx, path, debounce, polling, poll_interval, upload_concurrency, requests_per_minute):
+    """Publish, then republish documents whenever they change"""
+    from md2quip.watch import Watcher
+
+    require_quip_root(ctx)
+    m = get_md2quip(ctx)
+    m.project_root = path
+    m.rate_limiter.set_rate(requests_per_minute)
+    Watcher(
+        m, debounce=debounce, poll_interval=poll_interval, polling=polling, concurrency=upload_concurrency
+    ).run_forever()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,32 @@
+"""Default settings, kept apart from the modules that use them so that the CLI can show them cheaply."""
+
+# number of concurrent Quip API requests used when crawling the folder tree
+DEFAULT_CONCURRENCY = 8
+
+# number of ids sent in each get_folders/get_threads request
+DEFAULT_BATCH_SIZE = 100
+
+# .gitignore style patterns for the files find_files() collects
+DEFAULT_INCLUDE = ('*.md',)
+DEFAULT_EXCLUDE = ('.*', '/templates')
+
+# seconds a cached folder or thread is trusted without asking Quip again
+DEFAULT_CACHE_TTL = 3600
+
+# default cache directory, created next to md2quip.yml
+DEFAULT_CACHE_DIR = '.md2quip-cache'
+
+# Quip's default per-user limit
+DEFAULT_REQUESTS_PER_MINUTE = 50
+
+# persistent connections kept open to Quip
+DEFAULT_POOL_SIZE = 8
+
+# seconds to wait for Quip to respond
+DEFAULT_REQUEST_TIMEOUT = 120
+
+# seconds without another change before a burst of saves is published
+DEFAULT_DEBOUNCE = 0.5
+
+# seconds between scans of the project when watchdog isn't installed
+DEFAULT_POLL_INTERVAL = 1.0
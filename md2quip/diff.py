@@ -0,0 +1,141 @@
+"""Section level diffs between a Quip document and a newly rendered version of it."""
+
+import collections
+import difflib
+import html.parser
+import re
+
+import quipclient
+
+# a top level element of a document, section_id is None for our own rendered HTML
+Block = collections.namedtuple('Block', ['section_id', 'html', 'key'])
+
+# a single edit_document call
+Edit = collections.namedtuple('Edit', ['operation', 'section_id', 'content'])
+
+_VOID_ELEMENTS = frozenset(('area', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'))
+
+_ID_RE = re.compile(r"""\sid=(?:'([^']*)'|"([^"]*)")""")
+# the only attributes that change what a block looks like, where links go & which image is shown
+_SIGNIFICANT_ATTR_RE = re.compile(r"""\s(href|src)=(?:'([^']*)'|"([^"]*)")""")
+_TAG_RE = re.compile(r'<(/?)([a-zA-Z0-9]+)[^>]*?(/?)>')
+_SPACE_RE = re.compile(r'\s+')
+_TAG_SPACE_RE = re.compile(r'\s*(<[^>]*>)\s*')
+
+# Quip exports some tags differently to how markdown2 writes them
+_TAG_ALIASES = {'strong': 'b', 'em': 'i', 's': 'del', 'strike': 'del'}
+# layout wrappers that Quip adds & that don't change what the reader sees
+_IGNORED_TAGS = frozenset(('div', 'span'))
+
+
+class _BlockSplitter(html.parser.HTMLParser):
+    """Find the [start, end) offsets of each top level element"""
+
+    def __init__(self, text):
+        super().__init__(convert_charrefs=False)
+        # getpos() only counts '\n' as a line break, unlike splitlines()
+        self._line_offsets = [0]
+        for line in text.split('\n'):
+            self._line_offsets.append(self._line_offsets[-1] + len(line) + 1)
+        self._depth = 0
+        self._start = None
+        self.spans = []
+
+    def _offset(self):
+        line, col = self.getpos()
+        return self._line_offsets[line - 1] + col
+
+    def _end_offset(self):
+        return self._offset() + len(self.get_starttag_text() or '')
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_ELEMENTS:
+            if self._depth == 0:
+                self.spans.append((self._offset(), self._end_offset()))
+            return
+        if self._depth == 0:
+            self._start = self._offset()
+        self._depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if self._depth == 0:
+            self.spans.append((self._offset(), self._end_offset()))
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_ELEMENTS or self._depth == 0:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            line, col = self.getpos()
+            offset = self._line_offsets[line - 1] + col
+            self.spans.append((self._start, offset + len(f'</{tag}>')))
+
+
+def _normalize(block_html):
+    """Reduce a block to what matters when comparing Quip's HTML with ours: tag names, links, images & text"""
+
+    def tag(match):
+        closing, name, _ = match.groups()
+        name = name.lower()
+        name = _TAG_ALIASES.get(name, name)
+        if name in _IGNORED_TAGS:
+            return ''
+        attrs = ''.join(
+            f' {attr.group(1)}={attr.group(2) or attr.group(3)}'
+            for attr in _SIGNIFICANT_ATTR_RE.finditer(match.group(0))
+        )
+        return f'<{closing}{name}{attrs}>'
+
+    text = _TAG_RE.sub(tag, block_html).replace('\u200b', '')
+    # whitespace between tags is layout, not content
+    text = _TAG_SPACE_RE.sub(r'\1', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def split_blocks(document_html):
+    """Split a document into its top level Blocks"""
+    splitter = _BlockSplitter(document_html)
+    splitter.feed(document_html)
+    splitter.close()
+
+    blocks = []
+    for start, end in splitter.spans:
+        block_html = document_html[start:end]
+        match = _ID_RE.search(block_html)
+        section_id = (match.group(1) or match.group(2)) if match else None
+        blocks.append(Block(section_id, block_html, _normalize(block_html)))
+    return blocks
+
+
+def plan_edits(old_html, new_html):
+    """Work out the edit_document calls that turn old_html (from Quip) into new_html.
+
+    Unchanged sections are left alone so their comments survive. The edits are ordered from the end
+    of the document backwards, so every section_id they refer to still exists when it's used.
+    Returns None when the old document can't be edited section by section."""
+    old = split_blocks(old_html)
+    new = split_blocks(new_html)
+
+    if not old:
+        return [Edit(quipclient.QuipClient.APPEND, None, new_html)] if new else []
+    if any(block.section_id is None for block in old):
+        return None
+
+    matcher = difflib.SequenceMatcher(None, [b.key for b in old], [b.key for b in new], autojunk=False)
+    edits = []
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        content = '\n\n'.join(block.html for block in new[j1:j2])
+        if tag == 'equal':
+            continue
+        if tag == 'insert':
+            if i1 > 0:
+                edits.append(Edit(quipclient.QuipClient.AFTER_SECTION, old[i1 - 1].section_id, content))
+            else:
+                edits.append(Edit(quipclient.QuipClient.PREPEND, None, content))
+            continue
+        if tag == 'replace':
+            edits.append(Edit(quipclient.QuipClient.REPLACE_SECTION, old[i1].section_id, content))
+            i1 += 1
+        for block in old[i1:i2]:
+            edits.append(Edit(quipclient.QuipClient.DELETE_SECTION, block.section_id, ''))
+    return edits
@@ -0,0 +1,57 @@
+"""Finding the local files to publish, nothing here needs to talk to Quip."""
+
+import collections
+import logging
+import os
+
+from md2quip.matcher import compile_patterns
+
+logger = logging.getLogger(__name__)
+
+# a file found by iter_files(), path is relative to project_root & '/' separated
+LocalFile = collections.namedtuple('LocalFile', ['path', 'stat'])
+
+
+def wants_file(path, include, exclude):
+    """Would iter_files() yield the '/' separated path (relative to project_root)?"""
+    exclude = compile_patterns(tuple(exclude))
+    return compile_patterns(tuple(include)).match(path) and not (exclude.match(path) or exclude.match_parents(path))
+
+
+def iter_files(project_root, include, exclude):
+    """Walk project_root, yielding a LocalFile for each file that include & exclude pick, as soon as it is found"""
+    include = compile_patterns(tuple(include))
+    exclude = compile_patterns(tuple(exclude))
+
+    # (path relative to project_root, path on disk), popped in sorted order
+    stack = [('', project_root)]
+    seen = set()
+    while stack:
+        relative_dir, source_dir = stack.pop()
+        try:
+            with os.scandir(source_dir) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+            # we follow symlinks, so watch out for loops
+            st = os.stat(source_dir)
+        except OSError as e:
+            logger.warning(f"Skipping {source_dir}: {e}")
+            continue
+        if (st.st_dev, st.st_ino) in seen:
+            continue
+        seen.add((st.st_dev, st.st_ino))
+
+        subdirs = []
+        for entry in entries:
+            path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                is_dir = entry.is_dir()
+                if is_dir:
+                    # Skip any excluded directories, nothing below them is visited
+                    if not exclude.match(path, is_dir=True):
+                        subdirs.append((path, entry.path))
+                elif include.match(path) and not exclude.match(path):
+                    yield LocalFile(path, entry.stat())
+            except OSError as e:
+                logger.warning(f"Skipping {entry.path}: {e}")
+
+        stack.extend(reversed(subdirs))
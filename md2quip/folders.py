@@ -0,0 +1,70 @@
+"""Quip folders that mirror a project's directories."""
+
+import concurrent.futures
+import logging
+import posixpath
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class FolderMirror(object):
+    """The Quip folders below root_folder_id that match the directories of m's project, created as they're needed.
+
+    folder() returns a Future of a directory's folder_id straight away. Existing folders are found through
+    m's path index, which is only built the first time a directory below the root is asked for. Missing
+    folders are created on pool as soon as their parent exists, so sibling folders are created at the
+    same time & a tree takes as many round trips as it has levels, not as it has directories."""
+
+    def __init__(self, m, root_folder_id, pool, stats=None):
+        self.m = m
+        self.root_folder_id = root_folder_id
+        self.pool = pool
+        self.stats = stats
+        self._lock = threading.Lock()
+        # key='/' separated directory relative to project_root ('' for the root), value=Future of its folder_id
+        self._folders = {'': self._done(root_folder_id)}
+        self._indexed = False
+
+    @staticmethod
+    def _done(folder_id):
+        future = concurrent.futures.Future()
+        future.set_result(folder_id)
+        return future
+
+    def folder(self, directory):
+        with self._lock:
+            if directory not in self._folders and not self._indexed:
+                for path, folder_id in self.m._directory_index(self.root_folder_id).items():
+                    self._folders.setdefault(path, self._done(folder_id))
+                self._indexed = True
+            return self._folder(directory)
+
+    def _folder(self, directory):
+        future = self._folders.get(directory)
+        if future is None:
+            future = self._folders[directory] = concurrent.futures.Future()
+            parent = self._folder(posixpath.dirname(directory))
+            # submitted once the parent exists, rather than tying up a worker while it waits
+            parent.add_done_callback(lambda parent: self._submit(directory, parent, future))
+        return future
+
+    def _submit(self, directory, parent, future):
+        try:
+            self.pool.submit(self._create, directory, parent, future)
+        except RuntimeError as e:
+            # the pool has been shut down, don't leave anyone waiting for the folder
+            future.set_exception(e)
+
+    def _create(self, directory, parent, future):
+        try:
+            parent_id = parent.result()
+            response = self.m.quip_client.new_folder(posixpath.basename(directory), parent_id=parent_id)
+            folder_id = self.m._add_folder(response, parent_id)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        if self.stats is not None:
+            self.stats.incr('folders_created')
+        logger.info(f"Created folder {directory} ({folder_id})")
+        future.set_result(folder_id)
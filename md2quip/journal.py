@@ -0,0 +1,133 @@
+"""Checkpoints of a publish in progress, so that an interrupted publish can be resumed."""
+
+import html
+import json
+import logging
+import os
+import re
+import time
+
+from md2quip.diff import split_blocks
+
+logger = logging.getLogger(__name__)
+
+# lives in the project root next to the manifest, the leading '.' keeps it out of find_files()
+JOURNAL_FILE = '.md2quip-journal.jsonl'
+
+# how far behind ours Quip's clock may be, when deciding whether a document was created by a publish
+CLOCK_SKEW_USEC = 5 * 60 * 1000000
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def document_title(document_html):
+    """The title Quip gives a document created from document_html without one, the text of its first block"""
+    for block in split_blocks(document_html):
+        title = _SPACE_RE.sub(' ', html.unescape(_TAG_RE.sub('', block.html)).replace('\u200b', '')).strip()
+        if title:
+            return title
+    return None
+
+
+class Journal(object):
+    """Append only log of a publish, one JSON object per line.
+
+    A 'start' line is written before a file is sent to Quip & a 'done' line (with its manifest entry)
+    once it has been published. Every line is flushed as it's written, so if the process dies the
+    done lines say what needn't be published again, and a start without a done is a document that
+    may or may not have been created."""
+
+    def __init__(self, path, quip_root=None):
+        self.path = path
+        self.quip_root = quip_root
+        # key=path, value=manifest entry of everything published
+        self.done = {}
+        # key=path, value=start record of everything sent but not (yet) published
+        self.pending = {}
+        self._file = None
+
+    @classmethod
+    def load(cls, path, quip_root=None):
+        """Read back the journal at path, an empty journal is returned if it was for somewhere else"""
+        journal = cls(path, quip_root)
+        try:
+            with open(path, 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return journal
+
+        for n, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line may have been cut short, anything else is a mess
+                if n != len(lines) - 1:
+                    logger.warning(f"Ignoring unreadable line {n + 1} of {path}")
+                continue
+            if 'quip_root' in record:
+                if quip_root is not None and record['quip_root'] != quip_root:
+                    logger.warning(f"{path} was a publish to {record['quip_root']}, not {quip_root}, ignoring it")
+                    return cls(path, quip_root)
+            else:
+                journal._apply(record)
+        return journal
+
+    def _apply(self, record):
+        if record.get('event') == 'start':
+            self.pending[record['path']] = record
+        elif record.get('event') == 'done':
+            self.pending.pop(record['path'], None)
+            self.done[record['path']] = record['entry']
+
+    def match(self, threads):
+        """Pair up the pending files with documents they created before the publish was interrupted.
+        threads are the 'thread' parts of get_thread responses, a document matches if it has the title
+        a file would get & was created after the file was sent. Returns a dict of path -> thread."""
+        candidates = sorted(threads, key=lambda thread: thread.get('created_usec') or 0)
+        matches = {}
+        for path, record in sorted(self.pending.items(), key=lambda item: item[1]['started_usec']):
+            since = record['started_usec'] - CLOCK_SKEW_USEC
+            for thread in candidates:
+                if thread.get('title') == record['title'] and (thread.get('created_usec') or 0) >= since:
+                    candidates.remove(thread)
+                    matches[path] = thread
+                    break
+        return matches
+
+    def begin(self):
+        """Start a new journal, replacing whatever was there"""
+        self.close()
+        self.done = {}
+        self.pending = {}
+        self._file = open(self.path, 'w')
+        self._write({'quip_root': self.quip_root})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, sort_keys=True) + '\n')
+        self._file.flush()
+
+    def start(self, path, hash, title, **kwargs):
+        """Record that path is about to be sent to Quip, kwargs are the rest of its manifest entry"""
+        record = dict(kwargs, event='start', path=path, hash=hash, title=title, started_usec=int(time.time() * 1e6))
+        self.pending[path] = record
+        self._write(record)
+
+    def finish(self, path, entry):
+        """Record that path has been published, entry is what the manifest now says about it"""
+        self.pending.pop(path, None)
+        self.done[path] = entry
+        self._write({'event': 'done', 'path': path, 'entry': entry})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """The publish is over & everything is in the manifest, the journal is no longer needed"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,72 @@
+"""Record of published files, so that only changed files are pushed to Quip."""
+
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# lives in the project root, the leading '.' keeps it out of find_files()
+MANIFEST_FILE = '.md2quip-manifest.json'
+
+
+def hash_content(content):
+    """sha256 hex digest of a str or bytes"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+class Manifest(object):
+    """Map of relative path -> {'hash': ..., 'thread_id': ...} for everything published under quip_root.
+    assets is what has been uploaded under quip_root, see AssetStore.adopt()."""
+
+    def __init__(self, path, quip_root=None, entries=None, assets=None):
+        self.path = path
+        self.quip_root = quip_root
+        self.entries = entries if entries is not None else {}
+        self.assets = assets
+
+    @classmethod
+    def load(cls, path, quip_root=None):
+        """Load the manifest at path, an empty manifest is returned if it was published somewhere else"""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.debug(f"No manifest at {path}, everything will be published")
+            return cls(path, quip_root)
+
+        if quip_root is not None and data.get('quip_root') != quip_root:
+            logger.warning(f"{path} was published to {data.get('quip_root')}, not {quip_root}, ignoring it")
+            return cls(path, quip_root)
+
+        return cls(path, quip_root, data.get('files', {}), data.get('assets'))
+
+    def save(self):
+        """Atomically write the manifest back to disk"""
+        tmp_path = f"{self.path}.tmp"
+        data = {'quip_root': self.quip_root, 'files': self.entries}
+        if self.assets:
+            data['assets'] = self.assets
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def update(self, path, hash, thread_id, **kwargs):
+        """Record path as published, anything else we knew about the same thread is kept"""
+        entry = self.entries.get(path)
+        if entry is None or entry.get('thread_id') != thread_id:
+            entry = {}
+        self.entries[path] = dict(entry, hash=hash, thread_id=thread_id, **kwargs)
+
+    def remove(self, path):
+        self.entries.pop(path, None)
+
+    def is_unchanged(self, path, hash):
+        entry = self.entries.get(path)
+        return entry is not None and entry.get('hash') == hash
@@ -0,0 +1,124 @@
+"""Compiled .gitignore style path matching."""
+
+import collections
+import functools
+import re
+
+# a single parsed pattern, regex matches the whole '/' separated path relative to the project root
+_Rule = collections.namedtuple('_Rule', ['negate', 'dir_only', 'regex'])
+
+
+def _translate_glob(glob):
+    """Translate the body of a .gitignore pattern into a regular expression"""
+    i, n = 0, len(glob)
+    out = []
+    while i < n:
+        c = glob[i]
+        if c == '*':
+            if glob[i : i + 2] == '**':
+                at_start = i == 0 or glob[i - 1] == '/'
+                if at_start and glob[i + 2 : i + 3] == '/':
+                    # '**/' matches zero or more directories
+                    out.append('(?:.*/)?')
+                    i += 3
+                    continue
+                if at_start and i + 2 == n:
+                    # a trailing '/**' matches everything inside
+                    out.append('.*')
+                    i += 2
+                    continue
+            out.append('[^/]*')
+            while i + 1 < n and glob[i + 1] == '*':
+                i += 1
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = glob.find(']', i + 2 if glob[i + 1 : i + 2] in ('!', '^') else i + 1)
+            if j == -1 or j == i + 1:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1 : j].replace('\\', '\\\\')
+                if body[0] in ('!', '^'):
+                    body = '^' + body[1:]
+                out.append(f'[{body}]')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def _parse(pattern):
+    """Parse one .gitignore line into a _Rule, returns None for blank lines & comments"""
+    pattern = pattern.rstrip('\n')
+    if not pattern.strip() or pattern.startswith('#'):
+        return None
+    # trailing spaces are ignored unless escaped
+    if not pattern.endswith('\\ '):
+        pattern = pattern.rstrip(' ')
+
+    negate = pattern.startswith('!')
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith('\\!') or pattern.startswith('\\#'):
+        pattern = pattern[1:]
+
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+
+    # a '/' anywhere but the end anchors the pattern to the project root, otherwise it matches at any depth
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    if not pattern:
+        return None
+
+    prefix = '' if anchored else '(?:.*/)?'
+    return _Rule(negate, dir_only, f'{prefix}{_translate_glob(pattern)}')
+
+
+def _combine(rules):
+    """Merge runs of rules with the same polarity into one regex each, last run first"""
+    groups = []
+    for rule in rules:
+        if groups and groups[-1][0] == rule.negate:
+            groups[-1][1].append(rule.regex)
+        else:
+            groups.append((rule.negate, [rule.regex]))
+    return [(negate, re.compile('(?:' + '|'.join(regexes) + r')\Z', re.DOTALL)) for negate, regexes in reversed(groups)]
+
+
+class PathMatcher(object):
+    """A list of .gitignore style patterns compiled once into a few regular expressions.
+
+    Supports '!' negation, '**', patterns anchored with '/' and directory only patterns ending in '/'.
+    As with .gitignore the last matching pattern wins."""
+
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+        rules = [rule for rule in map(_parse, self.patterns) if rule is not None]
+        self._dir_groups = _combine(rules)
+        self._file_groups = _combine([rule for rule in rules if not rule.dir_only])
+
+    def __repr__(self):
+        return f"PathMatcher({list(self.patterns)!r})"
+
+    def match(self, path, is_dir=False):
+        """Does the '/' separated path (relative to the project root) match?"""
+        for negate, regex in self._dir_groups if is_dir else self._file_groups:
+            if regex.match(path):
+                return not negate
+        return False
+
+    def match_parents(self, path):
+        """Does any directory above path match? i.e. would the walk have pruned it"""
+        parts = path.split('/')[:-1]
+        return any(self.match('/'.join(parts[: i + 1]), is_dir=True) for i in range(len(parts)))
+
+
+@functools.lru_cache(maxsize=32)
+def compile_patterns(patterns):
+    """Cached PathMatcher for a tuple of patterns"""
+    return PathMatcher(patterns)
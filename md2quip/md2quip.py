@@ -1,80 +1,207 @@
 """Main module."""
 
-import fnmatch
+import collections
+import concurrent.futures
+import copy
 import logging
 import os
+import posixpath
 import pprint
+import stat
+import threading
+import time
 import urllib.error
 from urllib.parse import urlparse
 
 import quipclient  # https://github.com/quip/quip-api/issues/38
 
+from md2quip.assets import ASSETS_THREAD_TITLE, AssetStore, AssetUploader, hash_file
+from md2quip.cache import DEFAULT_CACHE_TTL, TreeCache
+from md2quip.defaults import DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, DEFAULT_EXCLUDE, DEFAULT_INCLUDE
+from md2quip.diff import plan_edits
+from md2quip.files import LocalFile, iter_files, wants_file
+from md2quip.folders import FolderMirror
+from md2quip.journal import JOURNAL_FILE, Journal, document_title
+from md2quip.manifest import MANIFEST_FILE, Manifest, hash_content
+from md2quip.plan import Plan
+from md2quip.ratelimit import DEFAULT_REQUESTS_PER_MINUTE, RateLimitedClient, RateLimiter
+from md2quip.records import FolderRecord, ThreadRecord
+from md2quip.render import DEFAULT_EXTRAS, Renderer, find_assets, rewrite_assets, rewrite_links
+from md2quip.stats import RunStats, debug_event
+from md2quip.transport import DEFAULT_POOL_SIZE, DEFAULT_REQUEST_TIMEOUT, PooledQuipClient
+
 logger = logging.getLogger(__name__)
 
+# an image or other local file referenced by a document, path is on disk & hash is of its content
+# (hash & stat are None if it doesn't exist)
+Asset = collections.namedtuple('Asset', ['path', 'hash', 'stat'])
+
+
+def _asset_state(assets):
+    """What the manifest records about a document's assets, missing ones are remembered so that the
+    document is published again when they turn up"""
+    return {
+        path: (
+            {'hash': asset.hash, 'size': asset.stat.st_size, 'mtime_ns': asset.stat.st_mtime_ns}
+            if asset.stat is not None
+            else {'hash': None}
+        )
+        for path, asset in assets.items()
+    }
+
 
-def _filter_paths(basename, path, is_dir, exclude):
-    """.gitignore style file filtering."""
-    for item in exclude:
-        # Items ending in '/' apply only to directories.
-        if item.endswith('/') and not is_dir:
-            continue
-        # Items starting with '/' apply to the whole path.
-        # In any other cases just the basename is used.
-        match = path if item.startswith('/') else basename
-        if fnmatch.fnmatch(match, item.strip('/')):
-            return True
-    return False
+def _chunks(items, size):
+    """Split a list into lists of at most size items"""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
 
 
 class md2quip(object):
     def __init__(
-        self, quip_root, project_root='.', quip_api_base_url=None, quip_api_access_token=None, quip_client=None
+        self,
+        quip_root,
+        project_root='.',
+        quip_api_base_url=None,
+        quip_api_access_token=None,
+        quip_client=None,
+        concurrency=DEFAULT_CONCURRENCY,
+        batch_size=DEFAULT_BATCH_SIZE,
+        cache_dir=None,
+        cache_ttl=DEFAULT_CACHE_TTL,
+        refresh_cache=False,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        include=DEFAULT_INCLUDE,
+        exclude=DEFAULT_EXCLUDE,
+        markdown_extras=DEFAULT_EXTRAS,
+        pool_size=DEFAULT_POOL_SIZE,
+        request_timeout=DEFAULT_REQUEST_TIMEOUT,
+        gzip=True,
     ):
 
+        # counts & timings for this run, summarised at the end of a crawl or publish
+        self.stats = RunStats()
+
+        # every API call, from any thread, shares the same requests per minute budget
+        self.rate_limiter = RateLimiter(requests_per_minute)
+
         if quip_api_base_url is not None and quip_api_access_token is not None:
             self.quip_api_base_url = quip_api_base_url
             self.quip_api_access_token = quip_api_access_token
 
-            self.quip_client = quipclient.QuipClient(
-                access_token=self.quip_api_access_token, base_url=self.quip_api_base_url, request_timeout=120
+            quip_client = PooledQuipClient(
+                access_token=self.quip_api_access_token,
+                base_url=self.quip_api_base_url,
+                request_timeout=request_timeout,
+                pool_size=pool_size,
+                gzip=gzip,
+                on_response=self._on_response,
             )
-        elif quip_client is not None:
-            self.quip_client = quip_client
-        else:
+        elif quip_client is None:
             raise Exception("No Quip API access provided")
 
+        self.quip_client = RateLimitedClient(quip_client, self.rate_limiter, stats=self.stats)
+
         self.quip_root_url = quip_root
         self.project_root = project_root
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
 
-        # key=folder_id, value=name
+        # key=folder_id, value=FolderRecord (None while it's being fetched)
         self._folder_cache = dict()
 
-        # key=thread_id, value=thread as a dict
+        # key=thread_id, value=ThreadRecord
         self._thread_cache = dict()
 
         # key=fully qualified path, value=folder_id
         self._path_cache = dict()
 
+        # key=folder_id, value=fully qualified path
+        self._folder_path = dict()
+
+        # key=(folder_id, thread title), value=thread_id
+        self._title_index = dict()
+
+        # folders whose threads are in _thread_cache & _title_index
+        self._indexed_folders = set()
+
+        # one crawl at a time, the caches above are shared with every for_target() copy
+        self._crawl_lock = threading.RLock()
+
+        # what has been published from project_root, see get_manifest()
+        self._manifest = None
+
+        # folders & threads from previous runs, so that we only re-fetch what has changed
+        self._tree_cache = None
+        if cache_dir is not None:
+            self._tree_cache = TreeCache(os.path.join(cache_dir, 'tree.sqlite'), ttl=cache_ttl)
+            if refresh_cache:
+                self._tree_cache.clear()
+
+        # hash -> blob URL of the images & files already uploaded to each workspace
+        self.assets = AssetStore(os.path.join(cache_dir, 'assets.json') if cache_dir is not None else None)
+
+        # documents are rendered to HTML locally, unchanged documents are never rendered twice
+        self.renderer = Renderer(
+            extras=markdown_extras, cache_dir=os.path.join(cache_dir, 'render') if cache_dir is not None else None
+        )
+
+    def _on_response(self, headers, size):
+        """Called by PooledQuipClient with every response, before it's decoded"""
+        self.rate_limiter.update_from_headers(headers)
+        self.stats.incr('bytes_fetched', size)
+
     def get_root_folder_id(self):
         """convert the quip_root URL (or partial URL or prefix_id) into a proper thread_id
         Quip folder_id & thread_id are not the same thing :(
         The id you see on a URL isn't a thread_id or a folder_id, but can be used as a thread_id for a
         one-way lookup to find the actual thread_id."""
-        logger.debug(f"Extracting secret_path from {self.quip_root_url}")
-        url = urlparse(self.quip_root_url)
+        self.quip_root_folder_id = self._resolve_root(self.quip_root_url)
+        logger.debug(f"root folder = {self.quip_root_folder_id}")
+
+    def _resolve_root(self, quip_root_url):
+        """Convert a quip_root URL into a folder_id, see get_root_folder_id()"""
+        logger.debug(f"Extracting secret_path from {quip_root_url}")
+        url = urlparse(quip_root_url)
         secret_path = url.path.split('/')[1]
+
+        if self._tree_cache is not None:
+            cached = self._tree_cache.get_alias(secret_path)
+            if cached is not None and self._tree_cache.is_fresh(cached[1]):
+                return cached[0]
+
         logger.debug(f"Converting {secret_path} to a folder_id")
         folder = self.quip_client.get_folder(secret_path)
-        self.quip_root_folder_id = folder.get('folder').get('id')
-        logger.debug(f"root folder = {pprint.pformat(self.quip_root_folder_id)}")
+        folder_id = folder.get('folder').get('id')
+        if self._tree_cache is not None:
+            self._tree_cache.put_folders([FolderRecord.from_response(folder)])
+            self._tree_cache.put_alias(secret_path, folder_id)
+        return folder_id
+
+    def for_target(self, quip_root, project_root, include=None, exclude=None):
+        """A copy of this md2quip that publishes project_root to quip_root.
+        The copy shares the Quip client, rate limit, stats, caches & renderer with this md2quip."""
+        target = copy.copy(self)
+        target.quip_root_url = quip_root
+        target.project_root = project_root
+        target.include = tuple(include) if include is not None else self.include
+        target.exclude = tuple(exclude) if exclude is not None else self.exclude
+        target.quip_root_folder_id = None
+        target._manifest = None
+        return target
 
     def find_thread_by_title(self, root_id, title):
+        """Find the thread called title in the folder root_id, returns None if there isn't one"""
         # prime our cache of folders & threads
-        self._descend_into_folder(folder_id=self.quip_root_folder_id, show_children=True)
+        if root_id not in self._indexed_folders:
+            self._descend_into_folder(folder_id=root_id, show_children=True)
 
-        logger.info(pprint.pformat(self._thread_cache))
+        return self._title_index.get((root_id, title))
 
-        return 'FHcAAAgmJDW'
+    def find_folder_by_path(self, path):
+        """Find the folder_id of a fully qualified path (e.g. 'Mccartney/simonmcc'), None if we haven't seen it"""
+        return self._path_cache.get(path)
 
     def get_metadata_thread(self):
         """Find or create a metadata thread"""
@@ -82,41 +209,478 @@ class md2quip(object):
         sync_string = "<p>README.md - thread_id_1</p><p data-thread-id=abc123>CHANGELOG.md</p>"
         metadata_thread_id = self.find_thread_by_title(self.quip_root_folder_id, metadata_title)
 
+        # an existing thread is left alone, sync_string is only a placeholder
         if metadata_thread_id is None:
             thread = self.quip_client.new_document(
                 content=sync_string, title=".md2quip metadata", format='html', member_ids=[self.quip_root_folder_id]
             )
             logger.info(f"sync_string published as {pprint.pformat(thread)}")
-        else:
-            logger.error('TODO: Update existing thread')
-
-        return
-
-    def publish(self, files, root_folder_id):
-        # publish rendered docs to quip
-        metadata_title = ".md2quip metadata"
-
-        sync_string = "<p>README.md - thread_id_1</p><p data-thread-id=abc123>CHANGELOG.md</p>"
-        metadata_thread_id = self.find_thread_by_title(root_folder_id, metadata_title)
-
-        if metadata_thread_id is None:
-            thread = self.quip_client.new_document(
-                content=sync_string, title=".md2quip metadata", format='html', member_ids=[root_folder_id]
+            metadata_thread_id = thread['thread']['id']
+
+        return metadata_thread_id
+
+    def publish(self, files, root_folder_id=None, concurrency=None, resume=False, at_root=False):
+        """Publish files (paths relative to project_root, or LocalFiles from iter_files()) to Quip.
+        files can be a generator, files are read & rendered on this thread as they arrive while up to
+        concurrency uploads run in the background.
+        Files that haven't changed since the last publish are skipped, changed files are updated in place.
+        New documents go in Quip folders that mirror their directories, or all in the root folder with at_root.
+        With resume, whatever an interrupted publish managed to do is kept, see _begin_journal()."""
+        self._publish([(self, files, root_folder_id)], concurrency, resume, at_root)
+
+    def sync_all(self, targets, concurrency=None, resume=False, at_root=False):
+        """Publish every file of several projects, targets are md2quip instances from for_target().
+        The targets share one upload pool & rate limit, and each quip_root is only resolved once, so a sync
+        where little has changed costs little no matter how many projects there are."""
+        self._publish([(target, target.iter_files(), None) for target in targets], concurrency, resume, at_root)
+
+    def plan(self, files, at_root=False):
+        """Work out what publish(files) would do without changing anything, in Quip or on disk, returns a Plan.
+        Only read calls are made, to find the root folder, to check that the documents of changed files
+        still exist & to find the folders new documents would go in (in batches, from the tree cache when
+        it's fresh). Unchanged files aren't even read."""
+        api_calls = self.stats.counters['api_calls']
+        self.get_root_folder_id()
+        root_folder_id = self.quip_root_folder_id
+        plan = Plan(self.quip_root_url, root_folder_id, self.project_root)
+        manifest = self.get_manifest()
+        self.assets.adopt(root_folder_id, manifest.assets)
+        counts = collections.Counter()
+        seen = set()
+
+        def track(files):
+            for file in files:
+                seen.add(file.path if isinstance(file, LocalFile) else file)
+                yield file
+
+        # (file, bytes, digest, manifest entry) of every file that would be sent to Quip
+        changed = []
+        # key=hash, value=Asset of every asset that would be uploaded
+        uploads = {}
+        for file, st, html, digest, assets, _ in self._read_files(track(files), manifest, counts):
+            changed.append((file, len(html.encode('utf-8')), digest, manifest.get(file)))
+            for asset in assets.values():
+                if asset.hash is not None and self.assets.get(root_folder_id, asset.hash) is None:
+                    uploads.setdefault(asset.hash, asset)
+        plan.unchanged = counts['skipped']
+
+        # documents that have been deleted from Quip are created again
+        thread_ids = [entry['thread_id'] for _, _, _, entry in changed if entry is not None]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            existing = self._fetch_threads(pool, list(dict.fromkeys(thread_ids)))
+
+        orphans = {
+            path: entry
+            for path, entry in manifest.entries.items()
+            if path not in seen and not os.path.exists(os.path.join(self.project_root, path))
+        }
+        moved_from = {entry.get('hash'): path for path, entry in orphans.items()}
+
+        directories = set()
+        if not at_root:
+            for file, _, _, entry in changed:
+                if entry is None or entry['thread_id'] not in existing:
+                    directory = posixpath.dirname(file)
+                    while directory:
+                        directories.add(directory)
+                        directory = posixpath.dirname(directory)
+        if directories:
+            index = self._directory_index(root_folder_id)
+            for directory in sorted(directories - set(index)):
+                plan.add('create_folder', directory)
+
+        for file, size, digest, entry in changed:
+            if entry is not None and entry['thread_id'] in existing:
+                plan.add('update', file, size, thread_id=entry['thread_id'])
+            elif digest in moved_from:
+                plan.add('create', file, size, moved_from=moved_from[digest])
+            else:
+                plan.add('create', file, size)
+        if uploads and self.assets.get_thread(root_folder_id) is None:
+            plan.add('create_assets_thread', ASSETS_THREAD_TITLE)
+        for digest, asset in uploads.items():
+            plan.add('upload_asset', os.path.relpath(asset.path, self.project_root), asset.stat.st_size, hash=digest)
+        for path, entry in sorted(orphans.items()):
+            plan.add('orphaned', path, thread_id=entry.get('thread_id'))
+
+        plan.planning_api_calls = self.stats.counters['api_calls'] - api_calls
+        return plan
+
+    def get_manifest(self):
+        """The manifest of project_root, loaded on first use & kept in memory after that"""
+        path = os.path.join(self.project_root, MANIFEST_FILE)
+        if self._manifest is None or (self._manifest.path, self._manifest.quip_root) != (path, self.quip_root_url):
+            self._manifest = Manifest.load(path, quip_root=self.quip_root_url)
+        return self._manifest
+
+    def _begin_journal(self, pool, manifest, root_folder_id, resume=False):
+        """Start journaling a publish of project_root, so that it can be resumed if it's interrupted.
+        With resume, the files an interrupted publish finished go into the manifest, as do the documents
+        it created but didn't get to record (found by title in root_folder_id), so none are created twice.
+        Without resume, a journal left by an interrupted publish of the same quip_root is an error."""
+        path = os.path.join(self.project_root, JOURNAL_FILE)
+        journal = Journal.load(path, quip_root=self.quip_root_url)
+        interrupted = bool(journal.pending or journal.done)
+        if interrupted and resume:
+            for file, entry in journal.done.items():
+                manifest.update(file, **entry)
+            if journal.pending:
+                self._reconcile(pool, manifest, journal, root_folder_id)
+            manifest.save()
+            logger.info(f"Resuming, {len(journal.done)} files were published before the interruption")
+        elif interrupted:
+            # starting afresh would forget documents that may already be in Quip & create them again
+            raise Exception(
+                f"{path} is left from an interrupted publish, publish with --resume to carry on from it"
+                " (or delete it to start over)"
             )
-            logger.info(f"sync_string published as {pprint.pformat(thread)}")
-        else:
-            logger.error('TODO: Update existing thread')
-
-        return
-
-        # self.build_quip_folder_list()
-        self._descend_into_folder(root_folder_id, self.quip_client, 0)
+        journal.begin()
+        return journal
+
+    def _reconcile(self, pool, manifest, journal, root_folder_id):
+        """Record the documents that journal's pending files created below root_folder_id in the manifest.
+        They're looked for in the root folder & the existing folders that mirror the files' directories."""
+        claimed = {entry.get('thread_id') for entry in manifest.entries.values()}
+        directories = {posixpath.dirname(path) for path in journal.pending}
+        index = self._directory_index(root_folder_id) if directories != {''} else {'': root_folder_id}
+        folder_ids = list(dict.fromkeys([root_folder_id] + [index[d] for d in sorted(directories) if d in index]))
+        thread_ids = [
+            child['thread_id']
+            for folder in self._get_folders(folder_ids).values()
+            for child in folder.get('children', ())
+            if 'thread_id' in child and child['thread_id'] not in claimed
+        ]
+        threads = []
+        for batch in pool.map(self._get_threads, _chunks(thread_ids, self.batch_size)):
+            threads.extend(thread['thread'] for thread in batch.values())
+
+        for file, thread in journal.match(threads).items():
+            record = journal.pending[file]
+            manifest.update(
+                file,
+                record['hash'],
+                thread['id'],
+                size=record.get('size'),
+                mtime_ns=record.get('mtime_ns'),
+                renderer=record.get('renderer'),
+                link=thread.get('link'),
+                assets=record.get('assets') or {},
+                links=record.get('links') or {},
+            )
+            logger.info(f"{file} was published as {thread.get('link') or thread['id']} before the interruption")
+
+    def _resolve_roots(self, pool, targets):
+        """Set quip_root_folder_id on every target that doesn't have one, returns the targets that failed"""
+        urls = list(dict.fromkeys(target.quip_root_url for target in targets))
+
+        def resolve(url):
+            try:
+                return self._resolve_root(url)
+            except (quipclient.QuipError, urllib.error.HTTPError) as e:
+                logger.error(f"Unable to find the Quip folder {url} ({e.code})")
+                return None
+
+        folder_ids = dict(zip(urls, pool.map(resolve, urls)))
+        for target in targets:
+            target.quip_root_folder_id = folder_ids[target.quip_root_url]
+        return [target for target in targets if target.quip_root_folder_id is None]
+
+    def _publish(self, jobs, concurrency=None, resume=False, at_root=False):
+        """The publish pipeline, jobs is a list of (md2quip, files, root_folder_id), one per project.
+        Projects are read & rendered on this thread one after another, while up to concurrency uploads
+        from any of them run in the background. The images & files documents refer to and the folders
+        new documents go in are created on pools of their own, documents wait for them & nothing waits
+        for documents. Progress is journaled as it's made, see _begin_journal().
+        Documents that link to documents which were only created later in the publish are updated at
+        the end, once the links can point at Quip."""
+        concurrency = concurrency or self.concurrency
+        failed = []
+        failed_roots = []
+        # (target, manifest, counts, journal, root_folder_id) for every project that has been started
+        started = []
+
+        def finished(future):
+            label, manifest, journal, counts, file, digest, st, assets, links = in_flight.pop(future)
+            try:
+                thread_id, action, link = future.result()
+            except Exception as e:
+                logger.error(f"Failed to publish {label}{file}: {e}")
+                failed.append(f"{label}{file}")
+                return
+            counts[action] += 1
+            entry = dict(
+                hash=digest,
+                thread_id=thread_id,
+                size=st.st_size,
+                mtime_ns=st.st_mtime_ns,
+                renderer=self.renderer.options_key,
+                link=link,
+                assets=_asset_state(assets),
+                links=links,
+            )
+            manifest.update(file, **entry)
+            journal.finish(file, entry)
+
+        def queue(target, files, manifest, journal, counts, root_folder_id, folders):
+            # file names are only ambiguous when there's more than one project
+            label = f"{target.project_root}/" if len(jobs) > 1 else ''
+            for file, st, html, digest, assets, links in target._read_files(files, manifest, counts):
+                # keep a bounded amount of work queued so that memory doesn't grow with the number of files
+                while len(in_flight) >= concurrency * 2:
+                    done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        finished(future)
+
+                urls = {
+                    path: uploader.upload(root_folder_id, asset.path, asset.hash)
+                    for path, asset in assets.items()
+                    if asset.hash is not None
+                }
+                if folders is not None and manifest.get(file) is None:
+                    # start on the folder now, so that folders are created as fast as files are found
+                    folders.folder(posixpath.dirname(file))
+                journal.start(
+                    file,
+                    digest,
+                    document_title(html),
+                    size=st.st_size,
+                    mtime_ns=st.st_mtime_ns,
+                    renderer=target.renderer.options_key,
+                    assets=_asset_state(assets),
+                    links=links,
+                )
+                future = pool.submit(target._upload, file, html, manifest.get(file), root_folder_id, urls, folders)
+                in_flight[future] = (label, manifest, journal, counts, file, digest, st, assets, links)
+
+        in_flight = {}
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        asset_pool = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        folder_pool = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            with self.stats.timer('publish'), pool, asset_pool, folder_pool:
+                uploader = AssetUploader(self.assets, self.quip_client, asset_pool, stats=self.stats)
+                unresolved = [
+                    target
+                    for target, _, root_folder_id in jobs
+                    if root_folder_id is None and getattr(target, 'quip_root_folder_id', None) is None
+                ]
+                failed_roots = self._resolve_roots(pool, unresolved)
+                if failed_roots and len(jobs) == 1:
+                    raise Exception(f"Unable to find the Quip folder {failed_roots[0].quip_root_url}")
+
+                for target, files, root_folder_id in jobs:
+                    if target in failed_roots:
+                        continue
+                    root_folder_id = root_folder_id or target.quip_root_folder_id
+                    manifest = target.get_manifest()
+                    journal = target._begin_journal(pool, manifest, root_folder_id, resume)
+                    counts = collections.Counter()
+                    # the manifest remembers what's been uploaded, even without a cache_dir
+                    self.assets.adopt(root_folder_id, manifest.assets)
+                    started.append((target, manifest, counts, journal, root_folder_id))
+                    folders = None if at_root else FolderMirror(target, root_folder_id, folder_pool, stats=self.stats)
+
+                    queue(target, files, manifest, journal, counts, root_folder_id, folders)
+
+                for future in concurrent.futures.as_completed(list(in_flight)):
+                    finished(future)
+
+                # a second pass for documents that were published before the documents they link to
+                for target, manifest, counts, journal, root_folder_id in started:
+                    queue(target, target._stale_links(manifest), manifest, journal, counts, root_folder_id, None)
+                for future in concurrent.futures.as_completed(list(in_flight)):
+                    finished(future)
+        finally:
+            for target, manifest, _, journal, root_folder_id in started:
+                manifest.assets = self.assets.get_root(root_folder_id)
+                manifest.save()
+                if journal.pending:
+                    # e.g. new_document timed out, the document may still have been created
+                    journal.close()
+                    logger.warning(
+                        f"{len(journal.pending)} files from {target.project_root} may or may not have reached Quip,"
+                        " publish with --resume to check before they're sent again"
+                    )
+                else:
+                    journal.remove()
+            self.assets.save()
+
+        self._log_published(started, len(jobs) > 1)
+        if failed_roots:
+            raise Exception(f"Unable to publish {', '.join(target.project_root for target in failed_roots)}")
+        if failed:
+            raise Exception(f"Failed to publish {len(failed)} files: {', '.join(failed)}")
+
+    def _log_published(self, started, several):
+        """Summarise a publish, with a line for each of the projects that was started"""
+        for target, _, counts, _, _ in started:
+            source = f" from {target.project_root}" if several else ''
+            logger.info(
+                f"Published {counts['created']} new, {counts['updated']} updated & {counts['skipped']} unchanged files"
+                f"{source}"
+            )
+        logger.info("Publish finished: %s", self.stats.summary())
 
+    def _read_files(self, files, manifest, counts):
+        """Local half of the publish pipeline, yields (file, stat, html, digest, assets, links) for files that have
+        changed. digest covers the source, the assets it uses, where its links to other documents go & the
+        renderer options, so changing how we render republishes everything. links maps the documents it
+        links to, to their Quip links (None if they haven't been published)."""
         for file in files:
-            with open(file, 'r') as f:
+            if isinstance(file, LocalFile):
+                file, st = file
+            else:
+                st = os.stat(os.path.join(self.project_root, file))
+
+            entry = manifest.get(file)
+            # same size, mtime & renderer options as last time (for the file & its assets), don't bother reading it
+            if (
+                entry is not None
+                and (entry.get('size'), entry.get('mtime_ns')) == (st.st_size, st.st_mtime_ns)
+                and entry.get('renderer') == self.renderer.options_key
+                and self._assets_unchanged(entry.get('assets') or {})
+                and self._links_unchanged(entry.get('links'), manifest)
+            ):
+                debug_event(logger, 'publish.unchanged', file=file)
+                counts['skipped'] += 1
+                continue
+
+            with open(os.path.join(self.project_root, file), 'r') as f:
                 content = f.read()
-                thread = self.quip_client.new_document(content=content, format='markdown', member_ids=[root_folder_id])
-                print(f"Published {file} as {pprint.pformat(thread)}")
+
+            key = self.renderer.cache_key(content)
+            html = self.renderer.render(content, key=key)
+            assets = self._find_assets(html, file, (entry or {}).get('assets') or {})
+
+            links = {}
+
+            def resolve(path):
+                if not self.wants_file(path):
+                    return None
+                links[path] = (manifest.get(path) or {}).get('link')
+                return links[path]
+
+            # links to documents we've already published point at Quip, not the repo
+            html = rewrite_links(html, file, resolve)
+
+            digest = key
+            if assets or links:
+                digest = hash_content(
+                    key
+                    + ''.join(f"\n{path}={asset.hash}" for path, asset in sorted(assets.items()))
+                    + ''.join(f"\n{path}->{link}" for path, link in sorted(links.items()))
+                )
+
+            if manifest.is_unchanged(file, digest):
+                debug_event(logger, 'publish.unchanged', file=file)
+                manifest.update(
+                    file,
+                    digest,
+                    entry['thread_id'],
+                    size=st.st_size,
+                    mtime_ns=st.st_mtime_ns,
+                    renderer=self.renderer.options_key,
+                    assets=_asset_state(assets),
+                    links=links,
+                )
+                counts['skipped'] += 1
+                continue
+
+            yield file, st, html, digest, assets, links
+
+    def _find_assets(self, html, file, previous):
+        """The local files a rendered document refers to, as a dict of path -> Asset.
+        previous is what the manifest knew about them, files that haven't changed aren't hashed again."""
+        assets = {}
+        for path in find_assets(html, file):
+            full_path = os.path.join(self.project_root, path)
+            try:
+                st = os.stat(full_path)
+            except OSError:
+                logger.warning(f"{file} refers to {path}, which doesn't exist")
+                assets[path] = Asset(full_path, None, None)
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            known = previous.get(path) or {}
+            if (known.get('size'), known.get('mtime_ns')) == (st.st_size, st.st_mtime_ns):
+                digest = known['hash']
+            else:
+                digest = hash_file(full_path)
+            assets[path] = Asset(full_path, digest, st)
+        return assets
+
+    def _assets_unchanged(self, previous):
+        """Do the assets recorded in the manifest still have the same size & mtime (or are still missing)?"""
+        for path, known in previous.items():
+            try:
+                st = os.stat(os.path.join(self.project_root, path))
+            except OSError:
+                if known.get('hash') is None:
+                    continue
+                return False
+            if (known.get('size'), known.get('mtime_ns')) != (st.st_size, st.st_mtime_ns):
+                return False
+        return True
+
+    @staticmethod
+    def _links_unchanged(links, manifest):
+        """Do the documents recorded as linked to still have the same Quip links?"""
+        return all((manifest.get(path) or {}).get('link') == link for path, link in (links or {}).items())
+
+    def _stale_links(self, manifest):
+        """The published files whose links to other documents now go somewhere else."""
+        return [
+            file
+            for file, entry in sorted(manifest.entries.items())
+            if not self._links_unchanged(entry.get('links'), manifest)
+            and os.path.isfile(os.path.join(self.project_root, file))
+        ]
+
+    def _upload(self, file, html, entry, root_folder_id, asset_urls=None, folders=None):
+        """Remote half of the publish pipeline, returns the thread_id, what was done to it & its link.
+        asset_urls maps the paths of the assets html refers to, to Futures of their uploaded URLs.
+        New documents go in the folder that folders (a FolderMirror) has for their directory, if there is one."""
+        if asset_urls:
+            html = rewrite_assets(html, file, {path: future.result() for path, future in asset_urls.items()})
+
+        if entry is not None and self._update_document(entry['thread_id'], html):
+            logger.info(f"Updated {file} ({entry['thread_id']})")
+            return entry['thread_id'], 'updated', entry.get('link')
+
+        folder_id = folders.folder(posixpath.dirname(file)).result() if folders is not None else root_folder_id
+        thread = self.quip_client.new_document(content=html, format='html', member_ids=[folder_id])
+        link = thread['thread'].get('link')
+        logger.info(f"Published {file} as {link or thread['thread']['id']}")
+        return thread['thread']['id'], 'created', link
+
+    def _update_document(self, thread_id, content, format='html'):
+        """Bring an existing document in line with content, only sending the sections that have changed.
+        Returns False if the document no longer exists or can't be edited section by section."""
+        try:
+            # always the live copy, the cached one may be older than the last edit
+            html = self.quip_client.get_thread(thread_id)['html']
+        except quipclient.QuipError as e:
+            logger.warning(f"Unable to read {thread_id} ({e.code}), it will be published again")
+            return False
+
+        edits = plan_edits(html, content)
+        if edits is None:
+            # sections we can't address would be left behind next to the new content
+            logger.warning(f"Unable to edit {thread_id} section by section, it will be published again")
+            return False
+
+        debug_event(
+            logger, 'publish.edits', thread_id=thread_id, edits=len(edits), bytes=sum(len(e.content) for e in edits)
+        )
+        for edit in edits:
+            self.quip_client.edit_document(
+                thread_id, edit.content, operation=edit.operation, format=format, section_id=edit.section_id
+            )
+
+        # our copy of the thread is now out of date
+        self._thread_cache.pop(thread_id, None)
+        return True
 
     def show_folders(self):
         self.get_root_folder_id()
@@ -127,94 +691,265 @@ class md2quip(object):
         self._descend_into_folder(folder_id=self.quip_root_folder_id, depth=0, show_children=True)
 
     def _descend_into_folder(self, folder_id, depth=0, show_children=False):
-        logger.debug(f"_descend_into_folder(folder_id={folder_id}, depth={depth}, show_children={show_children}")
-        logger.info(f"\nDescending into {folder_id}")
-
-        if folder_id in self._folder_cache:
-            return
-
-        self._folder_cache[folder_id] = ""
-
+        """Crawl the folder tree below folder_id breadth first, one level at a time.
+        All of the folders (and threads, if show_children is set) in a level are fetched in batches of
+        self.batch_size ids, with at most self.concurrency requests in flight."""
+        debug_event(logger, 'crawl.start', folder_id=folder_id, depth=depth, show_children=show_children)
+
+        level = [folder_id]
+        with self.stats.timer('crawl'), concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while level:
+                level = self._crawl_level(pool, level, depth, show_children)
+                depth += 1
+
+        logger.info("Crawl finished: %s", self.stats.summary())
+
+    def _get_folder(self, folder_id, depth=0):
+        """Fetch a single folder, returning None for folders we can't read"""
+        debug_event(logger, 'crawl.get_folder', folder_id=folder_id, depth=depth)
         try:
-            folder = self.quip_client.get_folder(folder_id)
+            return self.quip_client.get_folder(folder_id)
         except quipclient.QuipError as e:
             if e.code == 403:
                 logger.warn("%sSkipped over restricted folder %s." % ("  " * depth, folder_id))
             else:
                 logger.warn("%sSkipped over folder %s due to unknown error %d." % ("  " * depth, folder_id, e.code))
-            return
         except urllib.error.HTTPError as e:
             logger.error("%sSkipped over folder %s due to HTTP error %d." % ("  " * depth, folder_id, e.code))
-            return
-
-        title = folder["folder"].get("title", "Folder %s" % folder_id)
-        logger.info(f"Found folder {title} (depth={depth}, folder_id={folder_id})")
-
-        self._folder_cache[folder_id] = folder
-        logger.debug(f"_folder_cache keys: {self._folder_cache.keys()}")
-        logger.debug(f"_folder_cache = {pprint.pformat(self._folder_cache)}")
-
-        # self._path_cache
-        if 'parent_id' in folder['folder']:
-            parent_id = folder['folder']['parent_id']
-            logger.debug(f"parent_id = {parent_id}")
+        return None
 
-            full_path = title
-            while parent_id in self._folder_cache.keys():
-                parent = self._folder_cache.get(parent_id).get('folder')
-                logger.debug(f"parent = {pprint.pformat(parent)}")
-                full_path = f"{parent.get('title')}/{full_path}"
-                parent_id = parent.get('parent_id', None)
+    def _get_folders(self, folder_ids, depth=0):
+        """Fetch a batch of folders, returns a dict of folder_id -> folder"""
+        if len(folder_ids) == 1:
+            folder = self._get_folder(folder_ids[0], depth)
+            return {} if folder is None else {folder_ids[0]: folder}
 
+        debug_event(logger, 'crawl.get_folders', count=len(folder_ids), depth=depth)
+        try:
+            return self.quip_client.get_folders(folder_ids)
+        except (quipclient.QuipError, urllib.error.HTTPError) as e:
+            # a single unreadable folder fails the whole batch, retry them one at a time
+            debug_event(logger, 'crawl.get_folders.failed', code=e.code, count=len(folder_ids))
+            folders = {}
+            for folder_id in folder_ids:
+                folder = self._get_folder(folder_id, depth)
+                if folder is not None:
+                    folders[folder_id] = folder
+            return folders
+
+    def _get_threads(self, thread_ids):
+        """Fetch a batch of threads, returns a dict of thread_id -> thread"""
+        try:
+            if len(thread_ids) == 1:
+                return {thread_ids[0]: self.quip_client.get_thread(thread_ids[0])}
+            return self.quip_client.get_threads(thread_ids)
+        except (quipclient.QuipError, urllib.error.HTTPError) as e:
+            if len(thread_ids) == 1:
+                logger.warn(f"Skipped over thread {thread_ids[0]} due to error {e.code}.")
+                return {}
+            debug_event(logger, 'crawl.get_threads.failed', code=e.code, count=len(thread_ids))
+            threads = {}
+            for thread_id in thread_ids:
+                threads.update(self._get_threads([thread_id]))
+            return threads
+
+    def _fetch_folders(self, pool, folder_ids, depth=0):
+        """Fetch folders in batches of self.batch_size, spread over the pool.
+        Folders that are fresh in the tree cache aren't fetched at all, returns a dict of folder_id -> FolderRecord
+        and the set of folder_ids whose children haven't changed since they were cached."""
+        folders = {}
+        unchanged = set()
+
+        cached = {}
+        if self._tree_cache is not None:
+            cached = self._tree_cache.get_folders(folder_ids)
+            now = time.time()
+            for folder_id, (folder, fetched_at) in cached.items():
+                if self._tree_cache.is_fresh(fetched_at, now):
+                    folders[folder_id] = folder
+                    unchanged.add(folder_id)
+
+        def fetch(ids):
+            # responses are boiled down to records on the worker, so a batch's full JSON doesn't outlive it
+            return {
+                folder_id: FolderRecord.from_response(folder)
+                for folder_id, folder in self._get_folders(ids, depth).items()
+            }
+
+        fetched = {}
+        batches = _chunks([folder_id for folder_id in folder_ids if folder_id not in folders], self.batch_size)
+        for batch in pool.map(fetch, batches):
+            fetched.update(batch)
+
+        for folder_id, folder in fetched.items():
+            if folder_id in cached and cached[folder_id][0].updated_usec == folder.updated_usec:
+                unchanged.add(folder_id)
+
+        if self._tree_cache is not None and fetched:
+            self._tree_cache.put_folders(fetched.values())
+
+        folders.update(fetched)
+        return folders, unchanged
+
+    def _fetch_threads(self, pool, thread_ids, trusted=()):
+        """Fetch threads in batches of self.batch_size, spread over the pool, returns thread_id -> ThreadRecord.
+        Threads that are fresh in the tree cache, or are in trusted (their folder hasn't changed) aren't fetched."""
+        threads = {}
+
+        if self._tree_cache is not None:
+            now = time.time()
+            revalidated = []
+            for thread_id, (thread, fetched_at) in self._tree_cache.get_threads(thread_ids).items():
+                if self._tree_cache.is_fresh(fetched_at, now):
+                    threads[thread_id] = thread
+                elif thread_id in trusted:
+                    threads[thread_id] = thread
+                    revalidated.append(thread_id)
+            if revalidated:
+                self._tree_cache.touch_threads(revalidated)
+
+        def fetch(ids):
+            # Quip always sends the whole document, drop it as soon as possible
+            records = {}
+            for thread_id, thread in self._get_threads(ids).items():
+                self.stats.incr('html_bytes', len(thread.get('html', '')))
+                records[thread_id] = ThreadRecord.from_response(thread)
+            return records
+
+        fetched = {}
+        batches = _chunks([thread_id for thread_id in thread_ids if thread_id not in threads], self.batch_size)
+        for batch in pool.map(fetch, batches):
+            fetched.update(batch)
+
+        if self._tree_cache is not None and fetched:
+            self._tree_cache.put_threads(fetched.values())
+
+        threads.update(fetched)
+        return threads
+
+    def _crawl_level(self, pool, folder_ids, depth, show_children):
+        """Fetch one level of the folder tree, update the caches & return the folder_ids of the next level"""
+        # the same folder can be linked from more than one place, only visit it once
+        pending = [
+            folder_id
+            for folder_id in dict.fromkeys(folder_ids)
+            if folder_id not in self._folder_cache or (show_children and folder_id not in self._indexed_folders)
+        ]
+        for folder_id in pending:
+            self._folder_cache.setdefault(folder_id, None)
+
+        folders, unchanged = self._fetch_folders(pool, pending, depth)
+
+        next_level = []
+        thread_ids = []
+        trusted = set()
+        # (folder_id, thread_id) for every thread we find
+        placements = []
+        for folder_id in pending:
+            folder = folders.get(folder_id)
+            if folder is None:
+                continue
+
+            logger.info("Found folder %s (depth=%d, folder_id=%s)", folder.title, depth, folder_id)
+
+            self._folder_cache[folder_id] = folder
+            self.stats.incr('folders')
+
+            # parents are always visited a level before their children, so their path is already known
+            parent_path = self._folder_path.get(folder.parent_id)
+            full_path = f"{parent_path}/{folder.title}" if parent_path is not None else folder.title
+            self._folder_path[folder_id] = full_path
             self._path_cache[full_path] = folder_id
-        else:
-            self._path_cache[title] = folder_id
-
-        logger.debug(f"\nself._path_cache = \n{pprint.pformat(self._path_cache)}")
 
-        for child in folder["children"]:
-            if "folder_id" in child:
-                self._descend_into_folder(folder_id=child["folder_id"], depth=depth + 1, show_children=show_children)
-            elif "thread_id" in child and show_children:
-                if child["thread_id"] not in self._thread_cache.keys():
-                    thread = self.quip_client.get_thread(child["thread_id"])
-                    self._thread_cache[child["thread_id"]] = thread
-                logger.debug(f"thread = {pprint.pformat(thread)}")
+            next_level.extend(folder.folder_ids)
+            if show_children:
+                for thread_id in folder.thread_ids:
+                    placements.append((folder_id, thread_id))
+                    if thread_id not in self._thread_cache:
+                        thread_ids.append(thread_id)
+                        if folder_id in unchanged:
+                            trusted.add(thread_id)
+
+        threads = self._fetch_threads(pool, list(dict.fromkeys(thread_ids)), trusted)
+        self._thread_cache.update(threads)
+        self.stats.incr('threads', len(threads))
+        debug_event(
+            logger, 'crawl.level', depth=depth, folders=len(pending), threads=len(threads), next_level=len(next_level)
+        )
+
+        for folder_id, thread_id in placements:
+            thread = self._thread_cache.get(thread_id)
+            if thread is not None:
+                self._title_index[(folder_id, thread.title)] = thread_id
+        if show_children:
+            self._indexed_folders.update(folder_id for folder_id in pending if folder_id in folders)
+
+        return next_level
+
+    def _directory_index(self, root_folder_id):
+        """Map of '/' separated directory (relative to project_root, '' for the root) -> folder_id for every
+        folder below root_folder_id. Only folders are crawled, from the tree cache if it's fresh.
+        """
+        with self._crawl_lock:
+            self._descend_into_folder(folder_id=root_folder_id, show_children=False)
+            # walked down from root_folder_id rather than read from _path_cache, whose paths are relative to
+            # wherever a folder was first reached from
+            index = {'': root_folder_id}
+            seen = {root_folder_id}
+            level = [('', root_folder_id)]
+            while level:
+                next_level = []
+                for directory, folder_id in level:
+                    folder = self._folder_cache.get(folder_id)
+                    if folder is None:
+                        continue
+                    for child_id in folder.folder_ids:
+                        child = self._folder_cache.get(child_id)
+                        # the same folder can be linked from more than one place
+                        if child is None or child_id in seen:
+                            continue
+                        seen.add(child_id)
+                        path = posixpath.join(directory, child.title)
+                        if path not in index:
+                            index[path] = child_id
+                            next_level.append((path, child_id))
+                level = next_level
+            return index
+
+    def _add_folder(self, response, parent_id):
+        """Put a folder we've just created in parent_id into the path index & the tree cache, returns its folder_id"""
+        folder = FolderRecord.from_response(response)
+        folder.parent_id = folder.parent_id or parent_id
+        records = [folder]
+        with self._crawl_lock:
+            self._folder_cache[folder.id] = folder
+            parent_path = self._folder_path.get(parent_id)
+            full_path = f"{parent_path}/{folder.title}" if parent_path is not None else folder.title
+            self._folder_path[folder.id] = full_path
+            self._path_cache[full_path] = folder.id
+            # the cached parent would otherwise hide the new folder from the next run
+            parent = self._folder_cache.get(parent_id)
+            if parent is not None:
+                parent.folder_ids = tuple(parent.folder_ids) + (folder.id,)
+                records.append(parent)
+            if self._tree_cache is not None:
+                self._tree_cache.put_folders(records)
+        return folder.id
 
     def build_quip_folder_list(self, root_folder_id='JGMmOeQyhKz7'):
+        """Prime the folder & thread caches with everything below root_folder_id"""
+        # root_folder_id may be a secret_path rather than a real folder_id
         root_folder = self.quip_client.get_folder(root_folder_id)
-
-        for child in root_folder.get("children", []):
-            child_folder_id = child.get("folder_id")
-            child_thread_id = child.get("thread_id")
-            if child_folder_id:
-                child_details = self.quip_client.get_folder(child_folder_id)
-                logger.debug(f"child_details = {pprint.pformat(child_details)}")
-                self.build_quip_folder_list(root_folder_id=child_details['children'][0]['folder_id'])
-            elif child_thread_id:
-                child_details = self.quip_client.get_thread(child_thread_id)
-                logger.debug(f"child_details = {pprint.pformat(child_details)}")
+        self._descend_into_folder(folder_id=root_folder['folder']['id'], show_children=True)
 
     def find_files(self):
         """Walk project_root and collect files to be published"""
-        files = []
-        include = ['*.md']
-        exclude = ['.*', '/templates']
-
-        for source_dir, dirnames, filenames in os.walk(self.project_root, followlinks=True):
-            relative_dir = os.path.relpath(source_dir, self.project_root)
-
-            for dirname in list(dirnames):
-                path = os.path.normpath(os.path.join(relative_dir, dirname))
-                # Skip any excluded directories
-                if _filter_paths(basename=dirname, path=path, is_dir=True, exclude=exclude):
-                    dirnames.remove(dirname)
-            dirnames.sort()
-
-            for filename in filenames:
-                path = os.path.normpath(os.path.join(relative_dir, filename))
-                # only collect the files that match filters
-                if _filter_paths(basename=filename, path=path, is_dir=False, exclude=include):
-                    files.append(path)
-
-        return files
+        return [local_file.path for local_file in self.iter_files()]
+
+    def wants_file(self, path):
+        """Would iter_files() yield the '/' separated path (relative to project_root)?"""
+        return wants_file(path, self.include, self.exclude)
+
+    def iter_files(self):
+        """Walk project_root, yielding a LocalFile for each file to be published as soon as it is found"""
+        return iter_files(self.project_root, self.include, self.exclude)
@@ -0,0 +1,73 @@
+"""What a publish would do & roughly what it would cost, worked out without changing anything."""
+
+# estimated Quip API calls for each kind of operation, an update reads the document & makes at least one edit
+API_CALLS = {'create_folder': 1, 'create': 1, 'update': 2, 'upload_asset': 1, 'create_assets_thread': 1, 'orphaned': 0}
+
+
+def _size(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}GB"
+
+
+class Plan(object):
+    """The operations a publish of project_root to quip_root would carry out.
+
+    Each operation is a dict with at least 'op' (one of API_CALLS), 'path', 'bytes' of payload & 'api_calls'.
+    Publish never deletes or moves documents, files that have gone are listed as 'orphaned' & a new file
+    with the same content as one of them is marked as 'moved_from' it. Folders are created for the
+    directories of new documents that don't have one yet."""
+
+    def __init__(self, quip_root, root_folder_id=None, project_root=None):
+        self.quip_root = quip_root
+        self.root_folder_id = root_folder_id
+        self.project_root = project_root
+        self.operations = []
+        self.unchanged = 0
+        # read only calls made while planning
+        self.planning_api_calls = 0
+
+    def add(self, op, path, bytes=0, **kwargs):
+        self.operations.append(dict(kwargs, op=op, path=path, bytes=bytes, api_calls=API_CALLS[op]))
+
+    def count(self, op):
+        return sum(1 for operation in self.operations if operation['op'] == op)
+
+    @property
+    def api_calls(self):
+        return sum(operation['api_calls'] for operation in self.operations)
+
+    @property
+    def bytes(self):
+        return sum(operation['bytes'] for operation in self.operations)
+
+    def to_dict(self):
+        return {
+            'quip_root': self.quip_root,
+            'root_folder_id': self.root_folder_id,
+            'project_root': self.project_root,
+            'operations': self.operations,
+            'unchanged': self.unchanged,
+            'estimate': {'api_calls': self.api_calls, 'bytes': self.bytes},
+            'planning': {'api_calls': self.planning_api_calls},
+        }
+
+    def describe(self):
+        """The plan as lines of text"""
+        lines = []
+        for operation in self.operations:
+            detail = ''
+            if operation.get('thread_id'):
+                detail = f" ({operation['thread_id']})"
+            if operation.get('moved_from'):
+                detail += f", moved from {operation['moved_from']}"
+            lines.append(f"{operation['op']:20} {operation['path']}{detail} {_size(operation['bytes'])}")
+        lines.append(
+            f"{self.count('create_folder')} folders & {self.count('create')} documents to create, "
+            f"{self.count('update')} to update, {self.unchanged} unchanged, "
+            f"{self.count('upload_asset')} assets to upload & {self.count('orphaned')} orphaned"
+        )
+        lines.append(f"About {self.api_calls} API calls & {_size(self.bytes)} sent to Quip")
+        return lines
@@ -0,0 +1,185 @@
+"""Client side rate limiting & retries for the Quip API."""
+
+import functools
+import logging
+import random
+import threading
+import time
+import urllib.error
+
+import quipclient
+
+from md2quip.defaults import DEFAULT_REQUESTS_PER_MINUTE
+
+logger = logging.getLogger(__name__)
+
+# attempts made at a throttled request before giving up
+DEFAULT_MAX_RETRIES = 5
+
+# HTTP status codes Quip uses when we're going too fast
+RETRY_STATUS_CODES = (429, 503)
+
+
+def _header(headers, name):
+    """Case insensitive header lookup that copes with headers being None"""
+    if headers is None:
+        return None
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.lower())
+    return value
+
+
+class RateLimiter(object):
+    """Token bucket shared by every thread that talks to Quip.
+
+    Tokens refill at requests_per_minute, up to burst tokens can be spent at once. The bucket is also
+    drained by the X-Ratelimit-* headers Quip sends back, slowed down to the X-Ratelimit-Limit Quip
+    advertises if that's lower than ours, and paused completely by backoff()."""
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=None, clock=time.monotonic, sleep=None):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._sleep = sleep if sleep is not None else time.sleep
+        self._blocked_until = 0.0
+        # bumped whenever a new backoff starts, see call_with_retries()
+        self.backoffs = 0
+        # requests per minute Quip says we're allowed, None until it has told us
+        self.server_limit = None
+        self.set_rate(requests_per_minute, burst)
+
+    def set_rate(self, requests_per_minute, burst=None):
+        with self._lock:
+            self._requested = (requests_per_minute, burst)
+            self._apply_rate()
+            self._tokens = self.capacity
+            self._updated = self._clock()
+
+    def _apply_rate(self):
+        requests_per_minute, burst = self._requested
+        if self.server_limit is not None:
+            requests_per_minute = min(requests_per_minute, self.server_limit)
+        self.requests_per_minute = requests_per_minute
+        self.capacity = float(burst if burst is not None else max(requests_per_minute, 1))
+        if self.server_limit is not None:
+            self.capacity = min(self.capacity, float(max(self.server_limit, 1)))
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.requests_per_minute / 60.0)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request can be made"""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) * 60.0 / self.requests_per_minute
+            logger.debug(f"Rate limited, waiting {wait:.2f}s")
+            self._sleep(wait)
+
+    def backoff(self, delay):
+        """Stop every caller from making requests for delay seconds"""
+        with self._lock:
+            now = self._clock()
+            if self._blocked_until <= now:
+                self.backoffs += 1
+            self._blocked_until = max(self._blocked_until, now + delay)
+
+    def update_from_headers(self, headers):
+        """Honour the X-Ratelimit-Limit (per minute), X-Ratelimit-Remaining & X-Ratelimit-Reset (epoch seconds)
+        headers from a Quip response"""
+        limit = _header(headers, 'X-Ratelimit-Limit')
+        if limit is not None:
+            with self._lock:
+                if int(limit) != self.server_limit:
+                    self._refill(self._clock())
+                    self.server_limit = int(limit)
+                    self._apply_rate()
+                    self._tokens = min(self._tokens, self.capacity)
+        remaining = _header(headers, 'X-Ratelimit-Remaining')
+        if remaining is None:
+            return
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self._tokens, float(remaining))
+        reset = _header(headers, 'X-Ratelimit-Reset')
+        if int(remaining) <= 0 and reset is not None:
+            self.backoff(max(float(reset) - time.time(), 0))
+
+
+def retry_delay(error, attempt):
+    """How long to wait before retrying a throttled request, Retry-After wins over exponential backoff"""
+    headers = getattr(getattr(error, 'http_error', error), 'headers', None)
+    retry_after = _header(headers, 'Retry-After')
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    reset = _header(headers, 'X-Ratelimit-Reset')
+    if reset is not None:
+        return max(float(reset) - time.time(), 0)
+    return 2**attempt + random.uniform(0, 1)
+
+
+def call_with_retries(limiter, fn, *args, max_retries=DEFAULT_MAX_RETRIES, stats=None, **kwargs):
+    """Call fn through the limiter, backing off & retrying when Quip says we're going too fast.
+    Only the backoffs this call starts count towards max_retries, a request that was already in flight
+    when another caller started one was throttled along with it & just waits its turn again."""
+    attempt = 0
+    while True:
+        limiter.acquire()
+        backoffs = limiter.backoffs
+        if stats is not None:
+            stats.incr('api_calls')
+        try:
+            return fn(*args, **kwargs)
+        except (quipclient.QuipError, urllib.error.HTTPError) as e:
+            if e.code not in RETRY_STATUS_CODES:
+                raise
+            # another caller started a backoff while this request was in flight
+            throttled_with_others = limiter.backoffs != backoffs
+            limiter.update_from_headers(getattr(getattr(e, 'http_error', e), 'headers', None))
+            if throttled_with_others:
+                logger.debug(f"{getattr(fn, '__name__', fn)} throttled ({e.code}) during a backoff, retrying")
+            elif attempt >= max_retries:
+                raise
+            else:
+                delay = retry_delay(e, attempt)
+                logger.warning(f"{getattr(fn, '__name__', fn)} throttled ({e.code}), retrying in {delay:.1f}s")
+                limiter.backoff(delay)
+                attempt += 1
+            if stats is not None:
+                stats.incr('api_retries')
+
+
+class RateLimitedClient(object):
+    """Wrap a QuipClient (or anything that looks like one) so that every API call goes through a RateLimiter"""
+
+    def __init__(self, client, limiter, max_retries=DEFAULT_MAX_RETRIES, stats=None):
+        self.client = client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.stats = stats
+
+    def __getattr__(self, name):
+        if name == 'client':
+            raise AttributeError(name)
+        attr = getattr(self.client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return call_with_retries(
+                self.limiter, attr, *args, max_retries=self.max_retries, stats=self.stats, **kwargs
+            )
+
+        return call
@@ -0,0 +1,58 @@
+"""Compact in-memory records of Quip folders & threads."""
+
+
+class _Record(object):
+    """Base for records that keep a handful of fields from an API response & nothing else"""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def to_list(self):
+        """The record's fields in __slots__ order, from_list() turns them back into a record"""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class FolderRecord(_Record):
+    """What the crawl needs to know about a folder, from a get_folder response"""
+
+    __slots__ = ('id', 'parent_id', 'title', 'updated_usec', 'link', 'folder_ids', 'thread_ids')
+
+    @classmethod
+    def from_response(cls, response):
+        folder = response['folder']
+        children = response.get('children', ())
+        return cls(
+            folder['id'],
+            folder.get('parent_id'),
+            folder.get('title', f"Folder {folder['id']}"),
+            folder.get('updated_usec'),
+            folder.get('link'),
+            tuple(child['folder_id'] for child in children if 'folder_id' in child),
+            tuple(child['thread_id'] for child in children if 'thread_id' in child),
+        )
+
+
+class ThreadRecord(_Record):
+    """What the crawl needs to know about a thread, from a get_thread response.
+    The document itself isn't kept, fetch it again with get_thread when it's needed."""
+
+    __slots__ = ('id', 'title', 'updated_usec', 'link')
+
+    @classmethod
+    def from_response(cls, response):
+        thread = response['thread']
+        return cls(thread['id'], thread.get('title'), thread.get('updated_usec'), thread.get('link'))
@@ -0,0 +1,195 @@
+"""Local Markdown to Quip HTML rendering."""
+
+import collections
+import json
+import logging
+import os
+import posixpath
+import re
+import threading
+
+import markdown2
+
+from md2quip.manifest import hash_content
+
+logger = logging.getLogger(__name__)
+
+# bump when _quipify() changes, so that cached output from older versions isn't reused
+RENDERER_VERSION = 1
+
+# markdown2 extras that produce HTML Quip knows what to do with
+DEFAULT_EXTRAS = ('fenced-code-blocks', 'tables', 'strike', 'cuddled-lists')
+
+# rendered documents kept in memory
+DEFAULT_MEMORY_ITEMS = 1024
+
+_PRE_CODE_RE = re.compile(r'<pre><code[^>]*>(.*?)</code></pre>', re.DOTALL)
+_HREF_RE = re.compile(r'(<a\s[^>]*?href=")([^"]*)(")')
+_SRC_RE = re.compile(r'(<img\s[^>]*?src=")([^"]*)(")')
+_EXTERNAL_RE = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|/|#)')
+
+
+def _quipify(html):
+    """Reshape markdown2 output into the HTML Quip imports cleanly"""
+    # Quip has its own code block styling, drop the <code> wrapper
+    return _PRE_CODE_RE.sub(r'<pre>\1</pre>', html)
+
+
+def rewrite_links(html, source_path, resolve):
+    """Point relative links at other published documents.
+
+    resolve is called with the '/' separated path (relative to the project root) of each linked
+    file, and returns the Quip link to use instead, or None to leave the link alone."""
+    source_dir = posixpath.dirname(source_path)
+
+    def rewrite(match):
+        href = match.group(2)
+        if not href or _EXTERNAL_RE.match(href):
+            return match.group(0)
+        target, _, fragment = href.partition('#')
+        link = resolve(posixpath.normpath(posixpath.join(source_dir, target)))
+        if link is None:
+            return match.group(0)
+        if fragment:
+            link = f"{link}#{fragment}"
+        return f"{match.group(1)}{link}{match.group(3)}"
+
+    return _HREF_RE.sub(rewrite, html)
+
+
+# linked files that are uploaded along with the document, rather than left pointing at the repo
+ASSET_EXTENSIONS = frozenset(('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.pdf'))
+
+
+def _local_target(href, source_dir):
+    """The '/' separated path (relative to the project root) a relative href points at, None if it isn't local"""
+    if not href or _EXTERNAL_RE.match(href):
+        return None
+    path = posixpath.normpath(posixpath.join(source_dir, href.partition('#')[0].partition('?')[0]))
+    # nothing outside the project is ever uploaded
+    if path == '..' or path.startswith('../'):
+        return None
+    return path
+
+
+def _asset_matches(html):
+    """Yield the <img src> & asset <a href> matches of html"""
+    for match in _SRC_RE.finditer(html):
+        yield match
+    for match in _HREF_RE.finditer(html):
+        if posixpath.splitext(match.group(2).partition('#')[0])[1].lower() in ASSET_EXTENSIONS:
+            yield match
+
+
+def find_assets(html, source_path):
+    """Paths (relative to the project root) of the local images & files a rendered document refers to"""
+    source_dir = posixpath.dirname(source_path)
+    paths = (_local_target(match.group(2), source_dir) for match in _asset_matches(html))
+    return list(dict.fromkeys(path for path in paths if path is not None))
+
+
+def rewrite_assets(html, source_path, urls):
+    """Point references to local assets at their uploaded copies, urls maps asset paths to URLs"""
+    source_dir = posixpath.dirname(source_path)
+    replacements = {}
+    for match in _asset_matches(html):
+        url = urls.get(_local_target(match.group(2), source_dir))
+        if url is not None:
+            replacements[match.span(2)] = url
+
+    parts = []
+    end = 0
+    for (start, stop), url in sorted(replacements.items()):
+        parts.append(html[end:start])
+        parts.append(url)
+        end = stop
+    parts.append(html[end:])
+    return ''.join(parts)
+
+
+class _QuipMarkdown(markdown2.Markdown):
+    """markdown2 without pygments, Quip would throw the highlighting away anyway"""
+
+    def _get_pygments_lexer(self, lexer_name):
+        return None
+
+
+class RenderCache(object):
+    """Content addressed store of rendered documents, in memory & optionally on disk"""
+
+    def __init__(self, cache_dir=None, memory_items=DEFAULT_MEMORY_ITEMS):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.html")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        html = None
+        if self.cache_dir is not None:
+            try:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    html = f.read()
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._remember(key, html)
+        return html
+
+    def put(self, key, html):
+        if self.cache_dir is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._remember(key, html)
+
+    def _remember(self, key, html):
+        self._memory[key] = html
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+
+class Renderer(object):
+    """Render Markdown to Quip compatible HTML with markdown2, memoized on the source & renderer options"""
+
+    def __init__(self, extras=DEFAULT_EXTRAS, cache_dir=None):
+        self.extras = tuple(extras)
+        self.options_key = hash_content(json.dumps({'version': RENDERER_VERSION, 'extras': sorted(self.extras)}))
+        self.cache = RenderCache(cache_dir)
+        # markdown2.Markdown instances aren't thread safe
+        self._local = threading.local()
+
+    def cache_key(self, source):
+        """Identifies the rendered output of source, changes whenever the source or the renderer options do"""
+        return hash_content(self.options_key + source)
+
+    def render(self, source, key=None):
+        key = key or self.cache_key(source)
+        html = self.cache.get(key)
+        if html is None:
+            markdown = getattr(self._local, 'markdown', None)
+            if markdown is None:
+                markdown = self._local.markdown = _QuipMarkdown(extras=list(self.extras))
+            html = _quipify(markdown.convert(source))
+            markdown.reset()
+            self.cache.put(key, html)
+        return html
@@ -0,0 +1,74 @@
+"""Run statistics & cheap structured debug logging."""
+
+import collections
+import contextlib
+import logging
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+class _Fields(object):
+    """key=value pairs that are only formatted if the log record is emitted"""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(f"{k}={v}" for k, v in self.fields.items())
+
+
+def debug_event(logger, event, **fields):
+    """Log a structured debug event, costs next to nothing when DEBUG is off"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s", event, _Fields(fields))
+
+
+def peak_memory():
+    """Peak resident set size of this process in bytes, None where we can't tell"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RunStats(object):
+    """Thread safe counters & timers for a single md2quip run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = collections.Counter()
+        self.timings = collections.defaultdict(float)
+        self.started = time.perf_counter()
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Add the time spent in the with block to timings[name]"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[name] += elapsed
+
+    def summary(self):
+        with self._lock:
+            counters = ' '.join(f"{k}={v}" for k, v in sorted(self.counters.items()))
+            timings = ' '.join(f"{k}={v:.2f}s" for k, v in sorted(self.timings.items()))
+        elapsed = time.perf_counter() - self.started
+        peak = peak_memory()
+        memory = f"peak_memory={peak / 2**20:.1f}MB" if peak is not None else ''
+        return ' '.join(part for part in (counters, timings, f"elapsed={elapsed:.2f}s", memory) if part)
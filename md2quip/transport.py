@@ -0,0 +1,205 @@
+"""Keep-alive HTTP transport for the Quip API."""
+
+import contextlib
+import gzip
+import http.client
+import io
+import json
+import logging
+import mimetypes
+import queue
+import select
+import ssl
+import threading
+import urllib.error
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+import quipclient
+
+from md2quip.defaults import DEFAULT_POOL_SIZE, DEFAULT_REQUEST_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# errors that mean a kept-alive connection was closed under us
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+# requests that are safe to send again after the server may have seen them, a POST can create a document
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD'))
+
+
+def _is_dropped(conn):
+    """Whether the server has closed an idle connection, it has nothing to say to us until we send a request"""
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class ConnectionPool(object):
+    """Thread safe pool of persistent connections to a single scheme://host:port"""
+
+    def __init__(self, base_url, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_REQUEST_TIMEOUT):
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.size = size
+        self.timeout = timeout
+        self.connections_opened = 0
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+
+    def _connect(self):
+        with self._lock:
+            self.connections_opened += 1
+        logger.debug(f"Opening connection to {self.scheme}://{self.host}:{self.port or ''}")
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Borrow a connection, it goes back in the pool unless something went wrong with it"""
+        with self._slots:
+            conn = None
+            while conn is None:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if _is_dropped(conn):
+                    conn.close()
+                    conn = None
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            try:
+                yield conn, reused
+            except BaseException:
+                conn.close()
+                raise
+            # closed connections (stale, or the server asked us to) aren't worth keeping
+            if conn.sock is not None:
+                self._idle.put(conn)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request, returns (status, reason, headers, body).
+        A request that fails on a reused connection is sent again on a fresh one if it can't have reached
+        the server, or if sending it twice does no harm. Anything else is left to the caller."""
+        while True:
+            with self._connection() as (conn, reused):
+                try:
+                    conn.request(method, path, body=body, headers=headers or {})
+                except _STALE_CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    # the server closed an idle connection before it had the whole request
+                    conn.close()
+                    continue
+                try:
+                    response = conn.getresponse()
+                    data = response.read()
+                except _STALE_CONNECTION_ERRORS:
+                    if not reused or method not in _IDEMPOTENT_METHODS:
+                        raise
+                    # the server may have closed an idle connection, or failed part way through a GET
+                    conn.close()
+                    continue
+                if response.will_close:
+                    conn.close()
+                return response.status, response.reason, response.headers, data
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class PooledQuipClient(quipclient.QuipClient):
+    """QuipClient that reuses keep-alive connections from a ConnectionPool instead of urllib.
+
+    on_response, if given, is called with the headers & size on the wire of every response,
+    which is how the rate limiter hears about X-Ratelimit-* headers."""
+
+    def __init__(
+        self,
+        access_token=None,
+        base_url=None,
+        request_timeout=DEFAULT_REQUEST_TIMEOUT,
+        pool_size=DEFAULT_POOL_SIZE,
+        gzip=True,
+        on_response=None,
+        **kwargs,
+    ):
+        super().__init__(access_token=access_token, base_url=base_url, request_timeout=request_timeout, **kwargs)
+        self.pool = ConnectionPool(self.base_url, size=pool_size, timeout=request_timeout)
+        self.gzip = gzip
+        self.on_response = on_response
+
+    def _fetch_json(self, path, post_data=None, **args):
+        url = self._url(path, **args)
+        headers = {}
+        body = None
+        if post_data:
+            post_data = dict((k, v) for k, v in post_data.items() if v or isinstance(v, int))
+            body = urlencode(self._clean(**post_data)).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        return self._request(url, body, headers)
+
+    def put_blob(self, thread_id, blob, name=None):
+        """Upload an image or other file (bytes or a binary file-like object) to a thread.
+        Returns a dict with the blob's id & the url to use for it in the document, unlike
+        QuipClient.put_blob this doesn't need the requests module."""
+        if not isinstance(blob, bytes):
+            blob = blob.read()
+        name = name or 'blob'
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        boundary = uuid.uuid4().hex
+        filename = name.replace('"', '')
+        body = b''.join(
+            (
+                f'--{boundary}\r\n'.encode(),
+                f'Content-Disposition: form-data; name="blob"; filename="{filename}"\r\n'.encode(),
+                f'Content-Type: {content_type}\r\n\r\n'.encode(),
+                blob,
+                f'\r\n--{boundary}--\r\n'.encode(),
+            )
+        )
+        headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+        return self._request(self._url("blob/" + thread_id), body, headers)
+
+    def _request(self, url, body=None, headers=None):
+        """Send a request to Quip, GET unless there's a body, & return the decoded JSON response"""
+        headers = dict(headers or {})
+        if self.access_token:
+            headers['Authorization'] = 'Bearer ' + self.access_token
+        if self.gzip:
+            headers['Accept-Encoding'] = 'gzip'
+
+        parts = urlsplit(url)
+        request_path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        status, reason, response_headers, data = self.pool.request(
+            'POST' if body is not None else 'GET', request_path, body=body, headers=headers
+        )
+        if self.on_response is not None:
+            self.on_response(response_headers, len(data))
+        if response_headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+
+        if status >= 400:
+            error = urllib.error.HTTPError(url, status, reason, response_headers, io.BytesIO(data))
+            try:
+                # Extract the developer-friendly error message from the response
+                message = json.loads(data.decode())["error_description"]
+            except Exception:
+                raise error
+            raise quipclient.QuipError(status, message, error)
+
+        return json.loads(data.decode())
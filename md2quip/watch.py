@@ -0,0 +1,175 @@
+"""Watch a project for changes & republish the documents that changed."""
+
+import logging
+import os
+import threading
+import time
+
+from md2quip.defaults import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL
+
+try:
+    import watchdog.events
+    import watchdog.observers
+except ImportError:  # pip install md2quip[watch]
+    watchdog = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+
+class Debouncer(object):
+    """Collects changed paths & hands them over in batches, once nothing has changed for quiet seconds.
+    A steady stream of changes is still handed over every max_wait seconds."""
+
+    def __init__(self, quiet=DEFAULT_DEBOUNCE, max_wait=None, clock=time.monotonic):
+        self.quiet = quiet
+        self.max_wait = max_wait if max_wait is not None else quiet * 10
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._paths = set()
+        self._first = self._last = None
+        self._stopped = False
+
+    def add(self, path):
+        with self._condition:
+            now = self._clock()
+            if not self._paths:
+                self._first = now
+            self._paths.add(path)
+            self._last = now
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def wait(self, timeout=None):
+        """Block until a batch is ready, returns the set of paths in it.
+        An empty set is returned on timeout or once stop() has been called."""
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._condition:
+            while not self._stopped:
+                now = self._clock()
+                if self._paths:
+                    ready_at = min(self._last + self.quiet, self._first + self.max_wait)
+                    if now >= ready_at:
+                        paths, self._paths = self._paths, set()
+                        return paths
+                    wait = ready_at - now
+                else:
+                    wait = None
+                if deadline is not None:
+                    if now >= deadline:
+                        break
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._condition.wait(wait)
+        return set()
+
+
+class _Poller(threading.Thread):
+    """Scan the project every interval seconds & report files that are new or have changed"""
+
+    def __init__(self, m, callback, interval=DEFAULT_POLL_INTERVAL):
+        super().__init__(name='md2quip-poller', daemon=True)
+        self.m = m
+        self.callback = callback
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        return {f.path: (f.stat.st_size, f.stat.st_mtime_ns) for f in self.m.iter_files()}
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            snapshot = self._scan()
+            for path, signature in snapshot.items():
+                if self._snapshot.get(path) != signature:
+                    self.callback(path)
+            self._snapshot = snapshot
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def _watchdog_observer(project_root, callback):
+    """A watchdog Observer that calls callback with the path of every file that's created, changed or moved"""
+
+    class Handler(watchdog.events.FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory or event.event_type == 'deleted':
+                return
+            callback(getattr(event, 'dest_path', None) or event.src_path)
+
+    observer = watchdog.observers.Observer()
+    observer.schedule(Handler(), project_root, recursive=True)
+    return observer
+
+
+class Watcher(object):
+    """Republish the documents of an md2quip's project_root as they change.
+
+    The md2quip is kept for as long as we watch, so the resolved root folder, the manifest & the
+    rendered documents stay in memory between publishes. Filesystem events come from watchdog when
+    it's installed (or from polling the project when it isn't), and are filtered with the same
+    include & exclude patterns as publish."""
+
+    def __init__(
+        self, m, debounce=DEFAULT_DEBOUNCE, poll_interval=DEFAULT_POLL_INTERVAL, polling=False, **publish_args
+    ):
+        self.m = m
+        self.publish_args = publish_args
+        self.debouncer = Debouncer(debounce)
+        self._root = os.path.abspath(m.project_root)
+
+        if polling or watchdog is None:
+            if not polling:
+                logger.info("watchdog isn't installed, polling for changes instead")
+            self._observer = _Poller(m, self.debouncer.add, poll_interval)
+        else:
+            self._observer = _watchdog_observer(m.project_root, self._on_event)
+
+    def _on_event(self, path):
+        relative = os.path.relpath(os.path.abspath(path), self._root)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            return
+        relative = relative.replace(os.sep, '/')
+        if self.m.wants_file(relative):
+            self.debouncer.add(relative)
+
+    def start(self):
+        self._observer.start()
+        return self
+
+    def stop(self):
+        self.debouncer.stop()
+        self._observer.stop()
+
+    def publish_changes(self, timeout=None):
+        """Wait for a batch of changes & publish them, returns the paths that were published"""
+        paths = self.debouncer.wait(timeout)
+        # editors save via temporary files that are gone by now
+        paths = sorted(path for path in paths if os.path.isfile(os.path.join(self.m.project_root, path)))
+        if paths:
+            logger.info(f"Publishing {len(paths)} changed files: {', '.join(paths)}")
+            try:
+                # a journal left now is from one of our own publishes, pick up whatever it didn't finish
+                self.m.publish(paths, **dict(self.publish_args, resume=True))
+            except Exception as e:
+                # keep watching, the next save may well fix it
+                logger.error(f"Publish failed: {e}")
+        return paths
+
+    def run_forever(self):
+        """Publish everything that has changed since the last publish, then keep up with changes until interrupted"""
+        # start watching first, anything saved during the first publish is picked up straight after it
+        self.start()
+        self.m.publish(self.m.iter_files(), **self.publish_args)
+        logger.info(f"Watching {self.m.project_root} for changes")
+        try:
+            while True:
+                self.publish_changes()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
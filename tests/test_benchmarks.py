@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Smoke test of the simulated Quip API used by the benchmarks."""
+
+import os
+import tempfile
+import unittest
+
+from benchmarks.quipsim import QuipSimulator, build_tree
+from md2quip.md2quip import md2quip
+
+
+class TestQuipSimulator(unittest.TestCase):
+    def setUp(self):
+        self.sim = QuipSimulator(build_tree(depth=2, fanout=2, threads=3, doc_size=200)).start()
+        self.addCleanup(self.sim.stop)
+        self.project_root = tempfile.mkdtemp()
+
+    def md2quip(self):
+        return md2quip(
+            self.sim.root_url,
+            project_root=self.project_root,
+            quip_api_base_url=self.sim.base_url,
+            quip_api_access_token='test',
+            requests_per_minute=10000,
+        )
+
+    def test_crawl(self):
+        m = self.md2quip()
+        m.show_folders_and_docs()
+        self.assertEqual(m.stats.counters['folders'], 7)
+        self.assertEqual(m.stats.counters['threads'], 21)
+        # resolving the root & the root itself, then a get_folders & a get_threads for each level
+        self.assertEqual(self.sim.stats(), {'get_folder': 2, 'get_folders': 2, 'get_threads': 3})
+        self.assertEqual(m.find_folder_by_path('Root/folder-0-1/folder-1-0'), 'F0000000006')
+
+    def test_publish(self):
+        path = os.path.join(self.project_root, 'README.md')
+        with open(path, 'w') as f:
+            f.write("# Hello\n\nWorld\n")
+        self.md2quip().publish(['README.md'])
+        self.assertEqual(self.sim.stats()['new_document'], 1)
+
+        with open(path, 'a') as f:
+            f.write("\nAgain\n")
+        self.sim.reset()
+        self.md2quip().publish(['README.md'])
+        self.assertEqual(self.sim.stats(), {'get_folder': 1, 'get_thread': 1, 'edit_document': 1})
+        thread_id = self.sim.tree.folders['F0000000001']['children'][-1]['thread_id']
+        self.assertIn('Again</p>', self.sim.tree.get_thread(thread_id)['html'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.cli` start up."""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# modules that only commands talking to Quip should pay for
+HEAVY_MODULES = ('md2quip.md2quip', 'quipclient', 'markdown2', 'http.client', 'sqlite3', 'yaml')
+
+_STARTUP = """
+import json, sys, time
+start = time.perf_counter()
+from md2quip.cli import cli
+cli(['--quip-api-access-token', 'token', 'find-local-files'], standalone_mode=False, obj={})
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'modules': [m for m in %r if m in sys.modules]}))
+"""
+
+# generous, so that a slow CI machine doesn't fail, it's usually a few tens of ms
+MAX_STARTUP_SECONDS = 1.0
+
+
+class TestCli(unittest.TestCase):
+    def test_local_commands_start_quickly(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as project_root:
+            with open(os.path.join(project_root, 'README.md'), 'w') as f:
+                f.write("# README\n")
+            result = subprocess.run(
+                [sys.executable, '-c', _STARTUP % (HEAVY_MODULES,)],
+                cwd=project_root,
+                env=dict(os.environ, PYTHONPATH=root),
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+                check=True,
+            )
+        lines = result.stdout.splitlines()
+        self.assertIn("find_files() = ['README.md']", lines)
+        startup = json.loads(lines[-1])
+        self.assertEqual(startup['modules'], [])
+        self.assertLess(startup['elapsed'], MAX_STARTUP_SECONDS)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.diff`."""
+
+import unittest
+
+from quipclient import QuipClient
+
+from md2quip.diff import Edit, plan_edits, split_blocks
+
+# as returned by get_thread
+QUIP_HTML = (
+    "<h1 id='AAAACAsMaEC'>Title</h1>\n\n"
+    "<p id='AAAACAYoQVw' class='line'>First <b>paragraph</b></p>\n\n"
+    "<div data-section-style='5' class=''><ul id='AAAACAMpIEn'><li id='AAAACAMpIEo' class=''>one</li>"
+    "<li id='AAAACAMpIEp' class=''>two</li></ul></div>\n\n"
+    "<p id='AAAACAHlGTo' class='line'>Last​</p>\n\n"
+)
+
+# as rendered by markdown2
+RENDERED = (
+    "<h1>Title</h1>\n\n<p>First <strong>paragraph</strong></p>\n\n"
+    "<ul>\n<li>one</li>\n<li>two</li>\n</ul>\n\n<p>Last</p>\n"
+)
+
+
+class TestDiff(unittest.TestCase):
+    def test_split_blocks(self):
+        blocks = split_blocks(QUIP_HTML)
+        self.assertEqual([b.section_id for b in blocks], ['AAAACAsMaEC', 'AAAACAYoQVw', 'AAAACAMpIEn', 'AAAACAHlGTo'])
+        self.assertEqual(blocks[1].html, "<p id='AAAACAYoQVw' class='line'>First <b>paragraph</b></p>")
+        # Quip's markup & ours compare equal
+        self.assertEqual([b.key for b in blocks], [b.key for b in split_blocks(RENDERED)])
+
+    def test_unchanged(self):
+        self.assertEqual(plan_edits(QUIP_HTML, RENDERED), [])
+
+    def test_changed_sections(self):
+        rendered = "<h1>New title</h1>\n\n<p>Inserted</p>\n\n<p>First <strong>paragraph</strong></p>\n\n<p>Last</p>\n"
+        self.assertEqual(
+            plan_edits(QUIP_HTML, rendered),
+            [
+                Edit(QuipClient.DELETE_SECTION, 'AAAACAMpIEn', ''),
+                Edit(QuipClient.REPLACE_SECTION, 'AAAACAsMaEC', "<h1>New title</h1>\n\n<p>Inserted</p>"),
+            ],
+        )
+
+    def test_insert_at_start_and_end(self):
+        rendered = "<p>Preface</p>\n\n" + RENDERED + "\n<hr />\n"
+        self.assertEqual(
+            plan_edits(QUIP_HTML, rendered),
+            [
+                Edit(QuipClient.AFTER_SECTION, 'AAAACAHlGTo', '<hr />'),
+                Edit(QuipClient.PREPEND, None, '<p>Preface</p>'),
+            ],
+        )
+
+    def test_changed_link(self):
+        old = "<p id='AAAACAYoQVw' class='line'>See <a href='/blob/T/OLD'>the diagram</a></p>\n\n"
+        new = '<p>See <a href="/blob/T/NEW">the diagram</a></p>\n'
+        self.assertEqual(plan_edits(old, new.replace('NEW', 'OLD')), [])
+        self.assertEqual(plan_edits(old, new), [Edit(QuipClient.REPLACE_SECTION, 'AAAACAYoQVw', new.strip())])
+
+    def test_unusual_line_breaks(self):
+        # only '\n' ends a line as far as HTMLParser is concerned
+        text = "<p id='A'>one\u2028two\x0cthree\rfour</p>\n<p id='B'>five</p>\n"
+        blocks = split_blocks(text)
+        self.assertEqual([b.html for b in blocks], ["<p id='A'>one\u2028two\x0cthree\rfour</p>", "<p id='B'>five</p>"])
+
+    def test_empty_and_unaddressable_documents(self):
+        self.assertEqual(plan_edits('', RENDERED), [Edit(QuipClient.APPEND, None, RENDERED)])
+        self.assertIsNone(plan_edits('<p>no ids</p>', RENDERED))
+
+
+if __name__ == '__main__':
+    unittest.main()
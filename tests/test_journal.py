@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.journal`."""
+
+import os
+import tempfile
+import unittest
+
+from md2quip.journal import CLOCK_SKEW_USEC, Journal, document_title
+
+
+class TestJournal(unittest.TestCase):
+    def test_document_title(self):
+        self.assertEqual(document_title('<h1>Fish &amp; <i>chips</i></h1>\n\n<p>More</p>\n'), 'Fish & chips')
+        self.assertEqual(document_title("<p class='line'>\u200b</p>\n<p>Second line</p>\n"), 'Second line')
+        self.assertIsNone(document_title(''))
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            path = os.path.join(project_root, 'journal.jsonl')
+            journal = Journal(path, quip_root='https://quip.com/ROOT')
+            journal.begin()
+            journal.start('a.md', 'h1', 'a.md', size=7)
+            journal.start('b.md', 'h2', 'b.md', size=7)
+            journal.finish('a.md', {'hash': 'h1', 'thread_id': 'T1'})
+            journal.close()
+            with open(path, 'a') as f:
+                # killed half way through a line
+                f.write('{"event": "done", "pa')
+
+            journal = Journal.load(path, quip_root='https://quip.com/ROOT')
+            self.assertEqual(journal.done, {'a.md': {'hash': 'h1', 'thread_id': 'T1'}})
+            self.assertEqual(list(journal.pending), ['b.md'])
+            self.assertEqual(journal.pending['b.md']['size'], 7)
+
+            # a journal of a publish to somewhere else is no use to us
+            with self.assertLogs('md2quip.journal', level='WARNING'):
+                journal = Journal.load(path, quip_root='https://quip.com/ELSEWHERE')
+            self.assertEqual((journal.done, journal.pending), ({}, {}))
+
+            Journal(path).remove()
+            self.assertFalse(os.path.exists(path))
+
+    def test_match(self):
+        journal = Journal(None)
+        journal.pending = {
+            'a.md': {'path': 'a.md', 'title': 'Notes', 'started_usec': 2000000000},
+            'b.md': {'path': 'b.md', 'title': 'Notes', 'started_usec': 3000000000},
+            'c.md': {'path': 'c.md', 'title': 'c.md', 'started_usec': 3000000000},
+        }
+        threads = [
+            # created long before the publish, by someone else
+            {'id': 'OLD', 'title': 'Notes', 'created_usec': 2000000000 - CLOCK_SKEW_USEC - 1},
+            {'id': 'B', 'title': 'Notes', 'created_usec': 3000000100},
+            {'id': 'A', 'title': 'Notes', 'created_usec': 2000000100},
+        ]
+        matches = journal.match(threads)
+        self.assertEqual({path: thread['id'] for path, thread in matches.items()}, {'a.md': 'A', 'b.md': 'B'})
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.matcher`."""
+
+import unittest
+
+from md2quip.matcher import PathMatcher
+
+
+class TestPathMatcher(unittest.TestCase):
+    def test_basename_patterns_match_at_any_depth(self):
+        m = PathMatcher(['*.md', '.*'])
+        self.assertTrue(m.match('README.md'))
+        self.assertTrue(m.match('docs/api/index.md'))
+        self.assertTrue(m.match('docs/.git', is_dir=True))
+        self.assertFalse(m.match('docs/index.mdx'))
+        self.assertFalse(m.match('docs/md'))
+
+    def test_anchored_patterns(self):
+        m = PathMatcher(['/templates', 'docs/*.md'])
+        self.assertTrue(m.match('templates', is_dir=True))
+        self.assertFalse(m.match('docs/templates', is_dir=True))
+        self.assertTrue(m.match('docs/index.md'))
+        self.assertFalse(m.match('docs/api/index.md'))
+        self.assertFalse(m.match('other/docs/index.md'))
+
+    def test_double_star(self):
+        m = PathMatcher(['**/build', 'docs/**/*.md', 'site/**'])
+        self.assertTrue(m.match('build', is_dir=True))
+        self.assertTrue(m.match('a/b/build', is_dir=True))
+        self.assertTrue(m.match('docs/index.md'))
+        self.assertTrue(m.match('docs/a/b/index.md'))
+        self.assertTrue(m.match('site/a/b'))
+        self.assertFalse(m.match('site'))
+
+    def test_directory_only(self):
+        m = PathMatcher(['build/'])
+        self.assertTrue(m.match('build', is_dir=True))
+        self.assertFalse(m.match('build'))
+
+    def test_negation_last_match_wins(self):
+        m = PathMatcher(['*.md', '!CHANGELOG.md', 'docs/CHANGELOG.md'])
+        self.assertTrue(m.match('README.md'))
+        self.assertFalse(m.match('CHANGELOG.md'))
+        self.assertFalse(m.match('src/CHANGELOG.md'))
+        self.assertTrue(m.match('docs/CHANGELOG.md'))
+
+    def test_comments_escapes_and_classes(self):
+        m = PathMatcher(['# comment', '', r'\#hash', 'file[0-9].txt', 'x[!a].txt', 'q?.md'])
+        self.assertEqual(len(m._file_groups), 1)
+        self.assertTrue(m.match('#hash'))
+        self.assertTrue(m.match('file7.txt'))
+        self.assertFalse(m.match('fileA.txt'))
+        self.assertTrue(m.match('xb.txt'))
+        self.assertFalse(m.match('xa.txt'))
+        self.assertTrue(m.match('q1.md'))
+        self.assertFalse(m.match('q/.md'))
+
+    def test_match_parents(self):
+        m = PathMatcher(['/templates', '.*'])
+        self.assertTrue(m.match_parents('templates/a/b.md'))
+        self.assertTrue(m.match_parents('docs/.hidden/b.md'))
+        self.assertFalse(m.match_parents('docs/templates.md'))
+
+
+if __name__ == '__main__':
+    unittest.main()
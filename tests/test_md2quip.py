@@ -1,11 +1,22 @@
 #!/usr/bin/env python
 """Tests for `md2quip` package."""
 
+import collections
+import inspect
+import itertools
+import os
+import posixpath
+import re
+import tempfile
+import time
 import unittest
 
+import quipclient
 from click.testing import CliRunner
 
 from md2quip import cli
+from md2quip.journal import JOURNAL_FILE, document_title
+from md2quip.manifest import MANIFEST_FILE
 from md2quip.md2quip import md2quip
 
 """
@@ -16,6 +27,12 @@ call back to allow us to fake the resposes from the Quip API?
 
 class MockQuip(object):
     def __init__(self) -> None:
+        # count of calls made to each API method
+        self.calls: collections.Counter = collections.Counter()
+        # (thread_id, name, content) of every put_blob
+        self.blobs: list = []
+        self._folder_ids = itertools.count()
+
         self._folder_cache = {
             'DVRAOArKRoo': {
                 'children': [{'folder_id': 'TdIAOAZPeNB'}],
@@ -160,19 +177,66 @@ class MockQuip(object):
         return 'https://mccartney.quip.com/JGMmOeQyhKz7/Mccartney'
 
     def get_folder(self, id):
+        self.calls['get_folder'] += 1
         # fake the secret_path lookup for the 1 folder we're interested in
         if id == 'JGMmOeQyhKz7':
             return self._folder_cache['LUBAOAbA72T']
         else:
             return self._folder_cache.get(id)
 
+    def get_folders(self, ids):
+        self.calls['get_folders'] += 1
+        return {id: self._folder_cache[id] for id in ids if id in self._folder_cache}
+
     def get_thread(self, id):
+        self.calls['get_thread'] += 1
         return self._thread_cache.get(id)
-        return
 
-    # def new_document(content, format='markdown', member_ids=[root_folder_id]):
-    def new_document(content, format='markdown', member_ids=[]):
-        return
+    def get_threads(self, ids):
+        self.calls['get_threads'] += 1
+        return {id: self._thread_cache[id] for id in ids if id in self._thread_cache}
+
+    def new_document(self, content, format='html', title=None, member_ids=[]):
+        self.calls['new_document'] += 1
+        thread_id = f"NEW{len(self._thread_cache):08d}"
+        # Quip gives every top level section an id
+        blocks = [block.strip() for block in content.split('\n\n') if block.strip()]
+        html = ''.join(
+            re.sub(r'^<(\w+)', f"<\\1 id='{thread_id}{n}'", block, count=1) + '\n\n' for n, block in enumerate(blocks)
+        )
+        self._thread_cache[thread_id] = {
+            'html': html,
+            'thread': {
+                'id': thread_id,
+                'title': title or document_title(content),
+                'link': f"https://mccartney.quip.com/{thread_id}",
+                'created_usec': int(time.time() * 1e6),
+            },
+        }
+        for folder_id in member_ids:
+            if folder_id in self._folder_cache:
+                self._folder_cache[folder_id]['children'].append({'thread_id': thread_id})
+        return self._thread_cache[thread_id]
+
+    def new_folder(self, title, parent_id=None, color=None, member_ids=[]):
+        self.calls['new_folder'] += 1
+        folder_id = f"FOLDER{next(self._folder_ids):05d}"
+        self._folder_cache[folder_id] = {
+            'children': [],
+            'folder': {'id': folder_id, 'title': title, 'parent_id': parent_id},
+            'member_ids': [],
+        }
+        self._folder_cache[parent_id]['children'].append({'folder_id': folder_id})
+        return self._folder_cache[folder_id]
+
+    def put_blob(self, thread_id, blob, name=None):
+        self.calls['put_blob'] += 1
+        self.blobs.append((thread_id, name, blob.read()))
+        return {'id': f"BLOB{len(self.blobs)}", 'url': f"/blob/{thread_id}/BLOB{len(self.blobs)}"}
+
+    def edit_document(self, thread_id, content, operation=0, format='html', section_id=None, **kwargs):
+        self.calls['edit_document'] += 1
+        return self._thread_cache[thread_id]
 
 
 class TestMd2Quip(unittest.TestCase):
@@ -185,11 +249,494 @@ class TestMd2Quip(unittest.TestCase):
         self.assertEqual(result.exit_code, 2)
         self.assertIn('Error: Missing option \'--quip-api-access-token\'.', result.output)
 
+        # --publish-at-root is a flag, it doesn't swallow the option after it
+        for command in ('publish', 'plan'):
+            result = runner.invoke(
+                cli.cli, ['--quip-api-access-token', 'token', command, '--publish-at-root', '--help']
+            )
+            self.assertEqual(result.exit_code, 0, result.output)
+        with runner.isolated_filesystem():
+            args = ['--quip-api-access-token', 'token', 'publish', '--publish-at-root', '--resume']
+            result = runner.invoke(cli.cli, args)
+            self.assertEqual(result.exit_code, 2)
+            self.assertIn("Missing option '--quip-root'", result.output)
+
     def test_find_folders(self):
         q = MockQuip()
         m = md2quip(q.get_root_url(), quip_client=q)
         m.show_folders()
 
+        self.assertEqual(
+            m._path_cache,
+            {
+                'Mccartney': 'LUBAOAbA72T',
+                'Mccartney/simonmcc': 'DVRAOArKRoo',
+                'Mccartney/simonmcc/md2quip': 'TdIAOAZPeNB',
+            },
+        )
+        self.assertEqual(m._thread_cache, {})
+
+    def test_find_folders_and_docs(self):
+        for concurrency in (1, 4):
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), quip_client=q, concurrency=concurrency)
+            m.show_folders_and_docs()
+
+            self.assertEqual(set(m._folder_cache), {'LUBAOAbA72T', 'DVRAOArKRoo', 'TdIAOAZPeNB'})
+            self.assertEqual(set(m._thread_cache), {'FHcAAAgmJDW', 'aHTAAARyd1D', 'IYCAAAcDu8x'})
+            self.assertEqual(m._path_cache['Mccartney/simonmcc/md2quip'], 'TdIAOAZPeNB')
+
+    def test_find_thread_by_title(self):
+        q = MockQuip()
+        m = md2quip(q.get_root_url(), quip_client=q)
+        # a folders only crawl doesn't know about threads yet
+        m.show_folders()
+        m.get_root_folder_id()
+
+        self.assertEqual(m.find_thread_by_title('LUBAOAbA72T', '.md2quip metadata'), 'FHcAAAgmJDW')
+        self.assertEqual(m.find_thread_by_title('TdIAOAZPeNB', 'README.md'), 'aHTAAARyd1D')
+        self.assertIsNone(m.find_thread_by_title('LUBAOAbA72T', 'README.md'))
+        self.assertEqual(m.find_folder_by_path('Mccartney/simonmcc/md2quip'), 'TdIAOAZPeNB')
+        self.assertEqual(m._folder_path['TdIAOAZPeNB'], 'Mccartney/simonmcc/md2quip')
+
+        # the metadata thread already exists, so it's neither created nor overwritten
+        self.assertEqual(m.get_metadata_thread(), 'FHcAAAgmJDW')
+        self.assertEqual(q.calls['new_document'], 0)
+        self.assertEqual(q.calls['edit_document'], 0)
+
+    def test_crawl_stats(self):
+        q = MockQuip()
+        m = md2quip(q.get_root_url(), quip_client=q)
+        with self.assertLogs('md2quip.md2quip', level='INFO') as logs:
+            m.show_folders_and_docs()
+
+        self.assertEqual(m.stats.counters['folders'], 3)
+        self.assertEqual(m.stats.counters['threads'], 3)
+        self.assertEqual(m.stats.counters['api_calls'], sum(q.calls.values()))
+        self.assertGreater(m.stats.counters['html_bytes'], 0)
+        self.assertIn('crawl', m.stats.timings)
+        self.assertIn('Crawl finished: api_calls=6 folders=3 html_bytes=', logs.output[-1])
+
+    def test_batched_fetching(self):
+        q = MockQuip()
+        m = md2quip(q.get_root_url(), quip_client=q)
+        m.show_folders_and_docs()
+        # the 2 threads in md2quip/ are fetched with a single get_threads call
+        self.assertEqual(q.calls, {'get_folder': 4, 'get_thread': 1, 'get_threads': 1})
+
+        q = MockQuip()
+        m = md2quip(q.get_root_url(), quip_client=q, batch_size=1)
+        m.show_folders_and_docs()
+        self.assertEqual(q.calls, {'get_folder': 4, 'get_thread': 3})
+        self.assertEqual(set(m._thread_cache), {'FHcAAAgmJDW', 'aHTAAARyd1D', 'IYCAAAcDu8x'})
+
+    def test_tree_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), quip_client=q, cache_dir=cache_dir)
+            m.show_folders_and_docs()
+            # the root folder is cached as soon as it's resolved
+            self.assertEqual(q.calls, {'get_folder': 3, 'get_thread': 1, 'get_threads': 1})
+
+            # a warm run doesn't need to ask Quip anything, not even where the root folder is
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), quip_client=q, cache_dir=cache_dir)
+            m.show_folders_and_docs()
+            self.assertEqual(q.calls, {})
+            self.assertEqual(set(m._thread_cache), {'FHcAAAgmJDW', 'aHTAAARyd1D', 'IYCAAAcDu8x'})
+            self.assertEqual(m._path_cache['Mccartney/simonmcc/md2quip'], 'TdIAOAZPeNB')
+
+            # once the ttl expires the folders are re-validated, their threads haven't changed
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), quip_client=q, cache_dir=cache_dir, cache_ttl=0)
+            m.show_folders_and_docs()
+            self.assertEqual(q.calls, {'get_folder': 4})
+
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), quip_client=q, cache_dir=cache_dir, refresh_cache=True)
+            m.show_folders_and_docs()
+            self.assertEqual(q.calls, {'get_folder': 3, 'get_thread': 1, 'get_threads': 1})
+
+    def test_publish_only_changed_files(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            for name in ('README.md', 'CHANGELOG.md'):
+                with open(os.path.join(project_root, name), 'w') as f:
+                    f.write(f"# {name}\n")
+
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            m.publish(m.find_files())
+            self.assertEqual(q.calls['new_document'], 2)
+
+            # nothing has changed, so nothing is written
+            q.calls.clear()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {'get_folder': 1})
+
+            # rendering differently is a change, even though the files aren't
+            q.calls.clear()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q, markdown_extras=('strike',))
+            m.publish(m.find_files())
+            self.assertEqual(q.calls['get_thread'], 2)
+            q.calls.clear()
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {})
+
+            with open(os.path.join(project_root, 'README.md'), 'a') as f:
+                f.write("more words\n")
+            q.calls.clear()
+            m.publish(m.find_files())
+            # only the new paragraph is sent
+            self.assertEqual(q.calls, {'get_thread': 1, 'edit_document': 1})
+
+            # sections without ids can't be edited, so the document is published again rather than patched
+            thread_id = m.get_manifest().get('README.md')['thread_id']
+            q._thread_cache[thread_id]['html'] = "<p>no ids</p><p>still none</p>"
+            with open(os.path.join(project_root, 'README.md'), 'a') as f:
+                f.write("\neven more words\n")
+            q.calls.clear()
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {'get_thread': 1, 'new_document': 1})
+            self.assertNotEqual(m.get_manifest().get('README.md')['thread_id'], thread_id)
+
+    def test_publish_streams_files(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            for name in ('a.md', 'b.md', 'c.md'):
+                with open(os.path.join(project_root, name), 'w') as f:
+                    f.write(f"# {name}\n")
+
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            files = m.iter_files()
+            self.assertTrue(inspect.isgenerator(files))
+            first = next(files)
+            self.assertEqual(first.path, 'a.md')
+            self.assertEqual(first.stat.st_size, len("# a.md\n"))
+
+            m.publish(itertools.chain([first], files))
+            self.assertEqual(q.calls['new_document'], 3)
+
+            # files whose size & mtime haven't changed are skipped without being read
+            with open(os.path.join(project_root, 'a.md'), 'w') as f:
+                f.write("# A.md\n")
+            os.utime(os.path.join(project_root, 'a.md'), ns=(first.stat.st_atime_ns, first.stat.st_mtime_ns))
+            q.calls.clear()
+            m.publish(m.iter_files())
+            self.assertEqual(q.calls, {})
+
+    def test_publish_links_to_new_documents(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            with open(os.path.join(project_root, 'a.md'), 'w') as f:
+                f.write("# a\n\nSee [b](b.md#section).\n")
+            with open(os.path.join(project_root, 'b.md'), 'w') as f:
+                f.write("# b\n")
+
+            q = MockQuip()
+            edits = []
+            edit_document = q.edit_document
+            q.edit_document = lambda thread_id, content, **kwargs: (
+                edits.append(content) or edit_document(thread_id, content, **kwargs)
+            )
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            m.publish(m.find_files())
+            # a.md is published before b.md exists, so it's updated once b.md has a link
+            self.assertEqual(q.calls['new_document'], 2)
+            self.assertEqual(q.calls['edit_document'], 1)
+            b = m.get_manifest().get('b.md')['link']
+            self.assertIn(f'href="{b}#section"', edits[0])
+            self.assertEqual(m.get_manifest().get('a.md')['links'], {'b.md': b})
+
+            q.calls.clear()
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {})
+
+            # b.md published again as a new document, so a.md is stale even though it hasn't changed
+            m.get_manifest().remove('b.md')
+            m.get_manifest().save()
+            q.calls.clear()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            m.publish(m.find_files())
+            self.assertEqual(q.calls['new_document'], 1)
+            self.assertEqual(q.calls['edit_document'], 1)
+            self.assertIn(f'href="{m.get_manifest().get("b.md")["link"]}#section"', edits[-1])
+
+    def test_publish_assets(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            os.makedirs(os.path.join(project_root, 'images'))
+            with open(os.path.join(project_root, 'images', 'logo.png'), 'wb') as f:
+                f.write(b'logo')
+            for name in ('a.md', 'b.md'):
+                with open(os.path.join(project_root, name), 'w') as f:
+                    f.write(f"# {name}\n\n![logo](images/logo.png)\n")
+            cache_dir = os.path.join(project_root, '.md2quip-cache')
+
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q, cache_dir=cache_dir)
+            m.publish(m.find_files())
+            # the logo is shared, it's uploaded once to a thread of its own
+            self.assertEqual(q.calls['put_blob'], 1)
+            self.assertEqual(q.calls['new_document'], 3)
+            assets_thread, name, content = q.blobs[0]
+            self.assertEqual((name, content), ('logo.png', b'logo'))
+            self.assertIn(f'<img src="/blob/{assets_thread}/BLOB1"', q.get_thread('NEW00000005')['html'])
+
+            # a new run still knows it's been uploaded
+            q.calls.clear()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q, cache_dir=cache_dir)
+            with open(os.path.join(project_root, 'c.md'), 'w') as f:
+                f.write("![logo](images/logo.png)\n")
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {'new_document': 1})
+
+            # a changed image is uploaded again & the documents using it are updated
+            with open(os.path.join(project_root, 'images', 'logo.png'), 'wb') as f:
+                f.write(b'new logo')
+            q.calls.clear()
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {'put_blob': 1, 'get_thread': 3, 'edit_document': 3})
+
+            # an image that isn't there yet is remembered, so the document is updated once it is
+            with open(os.path.join(project_root, 'd.md'), 'w') as f:
+                f.write("![diagram](images/diagram.png)\n")
+            m.publish(m.find_files())
+            self.assertEqual(m.get_manifest().get('d.md')['assets'], {'images/diagram.png': {'hash': None}})
+            q.calls.clear()
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {})
+            with open(os.path.join(project_root, 'images', 'diagram.png'), 'wb') as f:
+                f.write(b'diagram')
+            m.publish(m.find_files())
+            self.assertEqual(q.calls, {'put_blob': 1, 'get_thread': 1, 'edit_document': 1})
+
+        # without a cache, the manifest remembers what's been uploaded
+        with tempfile.TemporaryDirectory() as project_root:
+            with open(os.path.join(project_root, 'logo.png'), 'wb') as f:
+                f.write(b'logo')
+            q = MockQuip()
+            for name in ('a.md', 'b.md', 'c.md'):
+                with open(os.path.join(project_root, name), 'w') as f:
+                    f.write(f"# {name}\n\n![logo](logo.png)\n")
+                m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+                m.publish(m.find_files())
+            self.assertEqual(q.calls['put_blob'], 1)
+            # the assets thread & the three documents
+            self.assertEqual(q.calls['new_document'], 4)
+
+    def test_mirror_directories(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            paths = ('README.md', 'simonmcc/notes.md', 'docs/index.md', 'docs/api/api.md', 'docs/guide/intro.md')
+            for path in paths:
+                os.makedirs(os.path.join(project_root, os.path.dirname(path)), exist_ok=True)
+                with open(os.path.join(project_root, path), 'w') as f:
+                    f.write(f"# {path}\n")
+            cache_dir = os.path.join(project_root, '.md2quip-cache')
+
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q, cache_dir=cache_dir)
+            plan = m.plan(m.iter_files())
+            self.assertEqual(
+                [op['path'] for op in plan.operations if op['op'] == 'create_folder'],
+                ['docs', 'docs/api', 'docs/guide'],
+            )
+            self.assertNotIn('new_folder', q.calls)
+
+            m.publish(m.iter_files())
+            # simonmcc already exists, the rest are created with each folder in its parent
+            self.assertEqual(q.calls['new_folder'], 3)
+            index = m._directory_index(m.quip_root_folder_id)
+            self.assertEqual(index['simonmcc'], 'DVRAOArKRoo')
+            for directory in ('docs', 'docs/api', 'docs/guide'):
+                folder = q.get_folder(index[directory])['folder']
+                self.assertEqual(folder['title'], posixpath.basename(directory))
+                self.assertEqual(folder['parent_id'], index[posixpath.dirname(directory)])
+            manifest = m.get_manifest()
+            for path in paths:
+                children = q.get_folder(index[posixpath.dirname(path)])['children']
+                self.assertIn({'thread_id': manifest.get(path)['thread_id']}, children)
+
+            # the tree cache knows about the new folders, so the next new document goes straight in
+            with open(os.path.join(project_root, 'docs', 'api', 'more.md'), 'w') as f:
+                f.write("# more\n")
+            q.calls.clear()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q, cache_dir=cache_dir)
+            m.publish(m.iter_files())
+            self.assertEqual(q.calls, {'new_document': 1})
+            children = q._folder_cache[index['docs/api']]['children']
+            self.assertIn({'thread_id': m.get_manifest().get('docs/api/more.md')['thread_id']}, children)
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            for name in ('a.md', 'b.md', 'c.md'):
+                with open(os.path.join(project_root, name), 'w') as f:
+                    f.write(f"# {name}\n")
+
+            q = MockQuip()
+            new_document = q.new_document
+
+            def timeout_after_creating(content, **kwargs):
+                thread = new_document(content, **kwargs)
+                if 'c.md' in content:
+                    raise quipclient.QuipError(504, 'Gateway Timeout', None)
+                return thread
+
+            q.new_document = timeout_after_creating
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            with self.assertRaises(Exception):
+                m.publish(m.iter_files())
+            self.assertEqual(q.calls['new_document'], 3)
+            # as if we'd been killed before the manifest was saved
+            os.remove(os.path.join(project_root, MANIFEST_FILE))
+            self.assertTrue(os.path.exists(os.path.join(project_root, JOURNAL_FILE)))
+
+            # publishing again without --resume would create c.md twice
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            with self.assertRaisesRegex(Exception, '--resume'):
+                m.publish(m.iter_files())
+            self.assertEqual(q.calls['new_document'], 3)
+            self.assertTrue(os.path.exists(os.path.join(project_root, JOURNAL_FILE)))
+
+            q.calls.clear()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            m.publish(m.iter_files(), resume=True)
+            # c.md is found in Quip rather than created again
+            self.assertEqual(q.calls, {'get_folder': 2, 'get_threads': 1})
+            self.assertEqual(m.get_manifest().get('c.md')['thread_id'], 'NEW00000005')
+            self.assertFalse(os.path.exists(os.path.join(project_root, JOURNAL_FILE)))
+
+            # as watch does, with nothing left to resume
+            with self.assertLogs('md2quip', level='INFO') as logs:
+                m.publish(m.iter_files(), resume=True)
+            self.assertFalse([line for line in logs.output if 'Resuming' in line])
+
+    def test_plan(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            for name in ('a.md', 'b.md'):
+                with open(os.path.join(project_root, name), 'w') as f:
+                    f.write(f"# {name}\n")
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            m.publish(m.iter_files())
+            manifest_path = os.path.join(project_root, MANIFEST_FILE)
+            with open(manifest_path) as f:
+                manifest = f.read()
+
+            with open(os.path.join(project_root, 'a.md'), 'a') as f:
+                f.write("more words\n")
+            os.rename(os.path.join(project_root, 'b.md'), os.path.join(project_root, 'd.md'))
+            with open(os.path.join(project_root, 'logo.png'), 'wb') as f:
+                f.write(b'logo')
+            with open(os.path.join(project_root, 'c.md'), 'w') as f:
+                f.write("![logo](logo.png)\n")
+
+            q.calls.clear()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            plan = m.plan(m.iter_files())
+            # nothing but reads, and only of the documents that would be updated
+            self.assertEqual(q.calls, {'get_folder': 1, 'get_thread': 1})
+            self.assertEqual(plan.planning_api_calls, 2)
+            with open(manifest_path) as f:
+                self.assertEqual(f.read(), manifest)
+
+            self.assertEqual(
+                [(op['op'], op['path'], op.get('moved_from')) for op in plan.operations],
+                [
+                    ('update', 'a.md', None),
+                    ('create', 'c.md', None),
+                    ('create', 'd.md', 'b.md'),
+                    ('create_assets_thread', '.md2quip assets', None),
+                    ('upload_asset', 'logo.png', None),
+                    ('orphaned', 'b.md', None),
+                ],
+            )
+            self.assertEqual(plan.to_dict()['estimate']['api_calls'], 6)
+            self.assertEqual(
+                plan.describe()[-2],
+                '0 folders & 2 documents to create, 1 to update, 0 unchanged, 1 assets to upload & 1 orphaned',
+            )
+
+    def test_sync_all(self):
+        with tempfile.TemporaryDirectory() as workspace:
+            roots = {'a': 'https://mccartney.quip.com/JGMmOeQyhKz7', 'b': 'https://mccartney.quip.com/TdIAOAZPeNB'}
+            for name in ('a', 'b', 'c'):
+                os.makedirs(os.path.join(workspace, name))
+                with open(os.path.join(workspace, name, 'README.md'), 'w') as f:
+                    f.write(f"# {name}\n")
+
+            def sync(q):
+                m = md2quip(None, quip_client=q, cache_dir=os.path.join(workspace, 'cache'))
+                targets = [
+                    m.for_target(roots.get(name, roots['a']), os.path.join(workspace, name)) for name in ('a', 'b', 'c')
+                ]
+                m.sync_all(targets)
+                return targets
+
+            q = MockQuip()
+            targets = sync(q)
+            # a & c share a quip_root, it's only looked up once
+            self.assertEqual(q.calls, {'get_folder': 2, 'new_document': 3})
+            self.assertEqual([t.quip_root_folder_id for t in targets], ['LUBAOAbA72T', 'TdIAOAZPeNB', 'LUBAOAbA72T'])
+
+            # with nothing changed, a warm sync doesn't talk to Quip at all
+            q.calls.clear()
+            sync(q)
+            self.assertEqual(q.calls, {})
+
+            with open(os.path.join(workspace, 'b', 'README.md'), 'a') as f:
+                f.write("more words\n")
+            q.calls.clear()
+            sync(q)
+            self.assertEqual(q.calls, {'get_thread': 1, 'edit_document': 1})
+
+        with tempfile.TemporaryDirectory() as workspace:
+            config = os.path.join(workspace, 'md2quip.yml')
+            with open(config, 'w') as f:
+                f.write("quip_api_access_token: token\n")
+            result = CliRunner().invoke(cli.cli, ['-c', config, 'sync-all'])
+            self.assertEqual(result.exit_code, 2)
+            self.assertIn('No targets found', result.output)
+
+    def test_sync_all_mirrors_nested_roots(self):
+        with tempfile.TemporaryDirectory() as workspace:
+            paths = {'b': 'sub/x.md', 'a': 'simonmcc/md2quip/x.md'}
+            for name, path in paths.items():
+                os.makedirs(os.path.join(workspace, name, posixpath.dirname(path)))
+                with open(os.path.join(workspace, name, path), 'w') as f:
+                    f.write(f"# {name}\n")
+
+            q = MockQuip()
+            m = md2quip(None, quip_client=q)
+            # b's root is md2quip, a folder that a's root reaches through simonmcc
+            targets = [
+                m.for_target('https://mccartney.quip.com/TdIAOAZPeNB', os.path.join(workspace, 'b')),
+                m.for_target('https://mccartney.quip.com/JGMmOeQyhKz7', os.path.join(workspace, 'a')),
+            ]
+            m.sync_all(targets)
+            self.assertEqual(q.calls['new_folder'], 1)
+            thread_id = targets[1].get_manifest().get(paths['a'])['thread_id']
+            self.assertIn({'thread_id': thread_id}, q._folder_cache['TdIAOAZPeNB']['children'])
+
+    def test_find_files(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            for path in ('README.md', 'docs/index.md', 'docs/api/api.md', 'docs/notes.txt', '.github/ci.md'):
+                os.makedirs(os.path.join(project_root, os.path.dirname(path)), exist_ok=True)
+                open(os.path.join(project_root, path), 'w').close()
+            os.makedirs(os.path.join(project_root, 'templates'))
+            open(os.path.join(project_root, 'templates', 'page.md'), 'w').close()
+
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            self.assertEqual(m.find_files(), ['README.md', 'docs/index.md', 'docs/api/api.md'])
+
+            m = md2quip(
+                q.get_root_url(),
+                project_root=project_root,
+                quip_client=q,
+                include=['*.md', '*.txt'],
+                exclude=['.*', 'api/'],
+            )
+            self.assertEqual(m.find_files(), ['README.md', 'docs/index.md', 'docs/notes.txt', 'templates/page.md'])
+
 
 if __name__ == '__main__':
     unittest.main()
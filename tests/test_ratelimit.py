@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.ratelimit`."""
+
+import unittest
+
+import quipclient
+
+from md2quip.ratelimit import RateLimitedClient, RateLimiter
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class ThrottledQuip(object):
+    """Fails the first `throttled` calls with a 429"""
+
+    def __init__(self, throttled):
+        self.throttled = throttled
+        self.calls = 0
+
+    def get_folder(self, id):
+        self.calls += 1
+        if self.calls <= self.throttled:
+            raise quipclient.QuipError(429, "Over Rate Limit", None)
+        return {'folder': {'id': id}}
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=60, burst=2, clock=clock, sleep=clock.sleep)
+
+        # the burst is free, after that 1 request per second
+        for _ in range(4):
+            limiter.acquire()
+        self.assertEqual(clock.slept, [1.0, 1.0])
+
+    def test_rate_limit_headers(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=60, clock=clock, sleep=clock.sleep)
+        limiter.update_from_headers({'X-Ratelimit-Remaining': '0'})
+        limiter.acquire()
+        self.assertEqual(clock.slept, [1.0])
+
+    def test_server_limit(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=600, clock=clock, sleep=clock.sleep)
+        limiter.update_from_headers({'X-Ratelimit-Limit': '60', 'X-Ratelimit-Remaining': '60'})
+        self.assertEqual((limiter.requests_per_minute, limiter.capacity), (60, 60.0))
+        # asking for more than Quip allows doesn't get it
+        limiter.set_rate(1200)
+        self.assertEqual(limiter.requests_per_minute, 60)
+        limiter.set_rate(30)
+        self.assertEqual(limiter.requests_per_minute, 30)
+
+    def test_retries_throttled_requests(self):
+        clock = FakeClock()
+        limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+        client = RateLimitedClient(ThrottledQuip(throttled=2), limiter)
+
+        self.assertEqual(client.get_folder('abc'), {'folder': {'id': 'abc'}})
+        self.assertEqual(client.client.calls, 3)
+        # exponential backoff between attempts
+        self.assertEqual(len(clock.slept), 2)
+        self.assertGreaterEqual(clock.slept[1], 2)
+
+        client = RateLimitedClient(ThrottledQuip(throttled=10), limiter, max_retries=1)
+        with self.assertRaises(quipclient.QuipError):
+            client.get_folder('abc')
+
+        # throttled while another caller's backoff started doesn't use up the retries
+        quip = ThrottledQuip(throttled=3)
+        get_folder = quip.get_folder
+
+        def throttled_with_others(id):
+            limiter.backoff(1)
+            return get_folder(id)
+
+        quip.get_folder = throttled_with_others
+        client = RateLimitedClient(quip, limiter, max_retries=1)
+        self.assertEqual(client.get_folder('abc'), {'folder': {'id': 'abc'}})
+        self.assertEqual(quip.calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
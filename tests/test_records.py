@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.records`."""
+
+import unittest
+
+from md2quip.records import FolderRecord, ThreadRecord
+
+
+class TestRecords(unittest.TestCase):
+    def test_folder_record(self):
+        record = FolderRecord.from_response(
+            {
+                'children': [{'thread_id': 'FHcAAAgmJDW'}, {'folder_id': 'DVRAOArKRoo'}],
+                'folder': {'id': 'LUBAOAbA72T', 'title': 'Mccartney', 'updated_usec': 1650889973865258},
+                'member_ids': ['MTVAEAAR5hw'],
+            }
+        )
+        self.assertEqual(record.title, 'Mccartney')
+        self.assertIsNone(record.parent_id)
+        self.assertEqual(record.folder_ids, ('DVRAOArKRoo',))
+        self.assertEqual(record.thread_ids, ('FHcAAAgmJDW',))
+        self.assertFalse(hasattr(record, '__dict__'))
+        # the tree cache stores records as JSON lists
+        self.assertEqual(FolderRecord.from_list(record.to_list()), record)
+
+    def test_thread_record(self):
+        record = ThreadRecord.from_response(
+            {
+                'html': '<h1>.md2quip metadata</h1>',
+                'thread': {'id': 'FHcAAAgmJDW', 'title': '.md2quip metadata', 'link': 'https://quip.com/S32J'},
+            }
+        )
+        self.assertEqual(record, ThreadRecord('FHcAAAgmJDW', '.md2quip metadata', None, 'https://quip.com/S32J'))
+        self.assertNotIn('html', record.__slots__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.render`."""
+
+import os
+import tempfile
+import unittest
+
+from md2quip.render import Renderer, find_assets, rewrite_assets, rewrite_links
+
+SOURCE = """# Title
+
+See [the api](api/index.md#usage), [home](https://example.com) & [top](#title).
+
+```python
+print("hello")
+```
+"""
+
+
+class TestRenderer(unittest.TestCase):
+    def test_render(self):
+        html = Renderer().render(SOURCE)
+        self.assertIn('<h1>Title</h1>', html)
+        # plain <pre> code blocks, no pygments markup
+        self.assertIn('<pre>print("hello")\n</pre>', html)
+        self.assertNotIn('<span', html)
+        self.assertNotIn('<code', html)
+
+    def test_render_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            renderer = Renderer(cache_dir=cache_dir)
+            html = renderer.render(SOURCE)
+            self.assertEqual(renderer.render(SOURCE), html)
+            self.assertEqual((renderer.cache.hits, renderer.cache.misses), (1, 1))
+
+            # a new renderer finds the output on disk
+            renderer = Renderer(cache_dir=cache_dir)
+            self.assertEqual(renderer.render(SOURCE), html)
+            self.assertEqual((renderer.cache.hits, renderer.cache.misses), (1, 0))
+
+            # different options, different key
+            renderer = Renderer(extras=['tables'], cache_dir=cache_dir)
+            self.assertNotEqual(renderer.cache_key(SOURCE), Renderer().cache_key(SOURCE))
+            renderer.render(SOURCE)
+            self.assertEqual(renderer.cache.misses, 1)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_rewrite_links(self):
+        links = {'docs/api/index.md': 'https://quip.com/api'}
+        html = rewrite_links(Renderer().render(SOURCE), 'docs/README.md', links.get)
+        self.assertIn('<a href="https://quip.com/api#usage">the api</a>', html)
+        self.assertIn('<a href="https://example.com">home</a>', html)
+        self.assertIn('<a href="#title">top</a>', html)
+
+    def test_assets(self):
+        source = (
+            "![logo](../images/logo.png) ![remote](https://example.com/x.png) ![up](../../secret.png)\n\n"
+            "[diagram](arch.pdf#page=2), [api](api/index.md) & ![logo again](/docs/../images/logo.png)\n"
+        )
+        html = Renderer().render(source)
+        self.assertEqual(find_assets(html, 'docs/README.md'), ['images/logo.png', 'docs/arch.pdf'])
+
+        urls = {'images/logo.png': '/blob/T/LOGO', 'docs/arch.pdf': '/blob/T/ARCH'}
+        html = rewrite_assets(html, 'docs/README.md', urls)
+        self.assertIn('<img src="/blob/T/LOGO" alt="logo" />', html)
+        self.assertIn('<a href="/blob/T/ARCH">diagram</a>', html)
+        self.assertIn('src="https://example.com/x.png"', html)
+        self.assertIn('<a href="api/index.md">api</a>', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
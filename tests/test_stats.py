@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.stats`."""
+
+import logging
+import unittest
+
+from md2quip.stats import RunStats, debug_event
+
+
+class Expensive(object):
+    formatted = 0
+
+    def __str__(self):
+        Expensive.formatted += 1
+        return 'expensive'
+
+
+class TestStats(unittest.TestCase):
+    def test_debug_events_are_lazy(self):
+        logger = logging.getLogger('md2quip.test_stats')
+        logger.setLevel(logging.INFO)
+        debug_event(logger, 'crawl.level', cache=Expensive())
+        self.assertEqual(Expensive.formatted, 0)
+
+        logger.setLevel(logging.DEBUG)
+        with self.assertLogs(logger, level='DEBUG') as logs:
+            debug_event(logger, 'crawl.level', depth=2, cache=Expensive())
+        self.assertEqual(logs.records[0].getMessage(), 'crawl.level depth=2 cache=expensive')
+
+    def test_run_stats(self):
+        stats = RunStats()
+        stats.incr('folders')
+        stats.incr('folders', 2)
+        with stats.timer('crawl'):
+            pass
+        self.assertEqual(stats.counters['folders'], 3)
+        self.assertRegex(stats.summary(), r'^folders=3 crawl=\d+\.\d\ds elapsed=\d+\.\d\ds( peak_memory=\d+\.\dMB)?$')
+
+
+if __name__ == '__main__':
+    unittest.main()
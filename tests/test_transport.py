@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.transport`."""
+
+import gzip
+import http.server
+import json
+import socketserver
+import threading
+import unittest
+
+import quipclient
+
+from md2quip.transport import PooledQuipClient
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """http.server.ThreadingHTTPServer, which needs Python 3.7"""
+
+    daemon_threads = True
+
+
+class QuipHandler(http.server.BaseHTTPRequestHandler):
+    """Just enough of the Quip API to exercise the transport"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        headers = {'Content-Type': 'application/json', 'X-Ratelimit-Remaining': '42'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dropped(self):
+        """Hang up without replying, once, on paths the test asked for, after the request has been handled"""
+        self.server.seen.append((self.command, self.path))
+        if self.path in self.server.drop:
+            self.server.drop.remove(self.path)
+            self.close_connection = True
+            return True
+        return False
+
+    def do_GET(self):
+        if self._dropped():
+            return
+        if self.path.startswith('/1/users/current'):
+            self._reply(200, {'id': 'USER', 'auth': self.headers.get('Authorization')})
+        else:
+            self._reply(404, {'error': 'Not Found', 'error_description': 'No such thing'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode(errors='replace')
+        if self._dropped():
+            return
+        self._reply(200, {'path': self.path, 'body': body, 'content_type': self.headers['Content-Type']})
+
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), QuipHandler)
+        self.server.seen = []
+        self.server.drop = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.responses = []
+        self.client = PooledQuipClient(
+            access_token='TOKEN',
+            base_url=self.base_url,
+            pool_size=2,
+            on_response=lambda headers, size: self.responses.append((headers, size)),
+        )
+
+    def tearDown(self):
+        self.client.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get_authenticated_user()['auth'], 'Bearer TOKEN')
+        self.assertEqual(self.client.pool.connections_opened, 1)
+
+    def test_gzip_and_response_hook(self):
+        self.client.get_authenticated_user()
+        headers, size = self.responses[0]
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['X-Ratelimit-Remaining'], '42')
+        self.assertGreater(size, 0)
+
+        plain = PooledQuipClient(access_token='TOKEN', base_url=self.base_url, gzip=False)
+        self.assertEqual(plain.get_authenticated_user()['id'], 'USER')
+        plain.pool.close()
+
+    def test_post(self):
+        response = self.client.new_document('<p>hello</p>', format='html')
+        self.assertEqual(response['path'], '/1/threads/new-document')
+        self.assertIn('content=%3Cp%3Ehello%3C%2Fp%3E', response['body'])
+
+    def test_put_blob(self):
+        response = self.client.put_blob('THREAD', b'\x89PNG', name='logo.png')
+        self.assertEqual(response['path'], '/1/blob/THREAD')
+        self.assertTrue(response['content_type'].startswith('multipart/form-data; boundary='))
+        self.assertIn('name="blob"; filename="logo.png"\r\nContent-Type: image/png\r\n\r\n', response['body'])
+
+    def test_errors(self):
+        with self.assertRaises(quipclient.QuipError) as raised:
+            self.client.get_thread('MISSING')
+        self.assertEqual(raised.exception.code, 404)
+        self.assertEqual(str(raised.exception), '404: No such thing')
+        # the connection survives an error response
+        self.client.get_authenticated_user()
+        self.assertEqual(self.client.pool.connections_opened, 1)
+
+    def test_dropped_connections(self):
+        self.client.get_authenticated_user()
+        # a GET can safely be sent again on a new connection
+        self.server.drop.add('/1/users/current')
+        self.assertEqual(self.client.get_authenticated_user()['id'], 'USER')
+        self.assertEqual(self.client.pool.connections_opened, 2)
+
+        # but a POST may have created something, so it isn't
+        self.server.seen.clear()
+        self.server.drop.add('/1/threads/new-document')
+        with self.assertRaises(Exception):
+            self.client.new_document('<p>hello</p>', format='html')
+        self.assertEqual(self.server.seen, [('POST', '/1/threads/new-document')])
+
+
+if __name__ == '__main__':
+    unittest.main()
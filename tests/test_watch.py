@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Tests for `md2quip.watch`."""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from md2quip.md2quip import md2quip
+from md2quip.watch import Debouncer, Watcher
+
+from .test_md2quip import MockQuip
+
+
+class TestWatch(unittest.TestCase):
+    def test_debouncer(self):
+        debouncer = Debouncer(quiet=0.05)
+        self.assertEqual(debouncer.wait(timeout=0.01), set())
+
+        for path in ('a.md', 'b.md', 'a.md'):
+            debouncer.add(path)
+        start = time.monotonic()
+        self.assertEqual(debouncer.wait(timeout=5), {'a.md', 'b.md'})
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+        threading.Timer(0.01, debouncer.stop).start()
+        self.assertEqual(debouncer.wait(), set())
+
+    def test_publish_changes(self):
+        with tempfile.TemporaryDirectory() as project_root:
+            for name in ('a.md', 'b.md'):
+                with open(os.path.join(project_root, name), 'w') as f:
+                    f.write(f"# {name}\n")
+
+            q = MockQuip()
+            m = md2quip(q.get_root_url(), project_root=project_root, quip_client=q)
+            m.publish(m.iter_files())
+
+            watcher = Watcher(m, debounce=0.05, poll_interval=0.02, polling=True).start()
+            self.addCleanup(watcher.stop)
+            q.calls.clear()
+            with open(os.path.join(project_root, 'a.md'), 'a') as f:
+                f.write("more words\n")
+            open(os.path.join(project_root, 'notes.txt'), 'w').close()
+
+            self.assertEqual(watcher.publish_changes(timeout=5), ['a.md'])
+            self.assertEqual(q.calls, {'get_thread': 1, 'edit_document': 1})
+
+            # filesystem events are filtered like find_files()
+            watcher._on_event(os.path.join(project_root, '.git', 'HEAD.md'))
+            watcher._on_event(os.path.join(project_root, 'b.md'))
+            self.assertEqual(watcher.debouncer.wait(timeout=5), {'b.md'})
+
+
+if __name__ == '__main__':
+    unittest.main()